@@ -0,0 +1,190 @@
+"""
+An asyncio front end for Search.
+
+Search runs git and waits for it to finish, which blocks the event loop of an
+asyncio program for as long as git takes. AsyncSearch runs the same git
+commands as asyncio subprocesses instead, at most concurrency of them at a
+time, so that one event loop can answer many queries at once. Everything
+else, from parsing git's output to the authors, the cache and the index, is
+left to a Search.
+
+This module needs Python 3.
+"""
+
+import asyncio
+import subprocess
+
+import git
+from git.compat import safe_decode
+
+from . import blame
+from . import history
+from . import stats
+from .search import Block, Search
+
+class AsyncSearch(object):
+    """
+    Like Search, but with coroutines for scoring. repo_path and options are
+    those of Search, except that it can't follow renames.
+    """
+
+    def __init__(self, repo_path, concurrency=8, **options):
+        if options.get('follow_renames'):
+            raise ValueError("AsyncSearch can't follow renames")
+        self.search = Search(repo_path, **options)
+        self.concurrency = concurrency
+
+        # Made on first use, as they must belong to the running event loop.
+        self._semaphore = None
+        self._tree_lock = None
+
+    def close(self):
+        self.search.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+    async def score_all_commits_over_time(self, block, timenow=None):
+        """
+        See Search.score_all_commits_over_time.
+        """
+
+        contributions, num_lines_total = await self._lines_contributed_history(block)
+        return self.search._score_author_contributions(contributions,
+                timenow=timenow, aging='exp')
+
+    async def score_all_commits(self, block):
+        """
+        See Search.score_all_commits.
+        """
+
+        contributions, num_lines_total = await self._lines_contributed_history(block)
+        return self.search._score_author_contributions(contributions)
+
+    async def score_last_commit(self, block):
+        """
+        See Search.score_last_commit.
+        """
+
+        contributions, num_lines_total = await self._lines_contributed(block)
+        return self.search._score_author_contributions(contributions)
+
+    async def _lines_contributed_history(self, block, rev=None):
+        """
+        See Search._lines_contributed_history.
+        """
+
+        search = self.search
+        block = Block.of(block)
+        if block.is_tree():
+            return await self._tree_contributions('history', block,
+                    rev or block.rev or 'HEAD')
+        rev, found = search._known_contributions('history',
+                rev or block.rev or 'HEAD', block)
+        if found is not None:
+            return found
+
+        args, kwargs = search._log_args(block, rev)
+        lines = await self._git_lines('log', *args, **kwargs)
+        contributions, num_lines_total, merges = search._history_contributions(
+                block, history.parse_log(lines))
+
+        if merges:
+            blamed, blamed_total = await self._lines_contributed(block, rev)
+            num_lines_total += search._merge_contributions(contributions,
+                    merges, blamed)
+
+        search._remember_contributions('history', rev, block, contributions)
+        return contributions, num_lines_total
+
+    async def _lines_contributed(self, block, rev=None):
+        """
+        See Search._lines_contributed.
+        """
+
+        search = self.search
+        block = Block.of(block)
+        if block.is_tree():
+            return await self._tree_contributions('blame', block,
+                    rev or block.rev or 'HEAD')
+        rev, found = search._known_contributions('blame',
+                rev or block.rev or 'HEAD', block)
+        if found is not None:
+            return found
+
+        args, kwargs = search._blame_args(block, rev)
+        lines = await self._git_lines('blame', *args, **kwargs)
+        contributions, num_lines_total = search._blame_contributions(
+                blame.parse_incremental(lines))
+
+        search._remember_contributions('blame', rev, block, contributions)
+        return contributions, num_lines_total
+
+    async def _tree_contributions(self, kind, block, rev):
+        """
+        See Search._tree_contributions. The files of block that search.tree
+        doesn't know yet are found first, all at the same time, so that adding
+        them up runs no more git.
+
+        search.tree holds one commit at a time, so queries about directories
+        and glob patterns take turns: otherwise one could move the tree to
+        another commit while another waits for its files.
+        """
+
+        if self._tree_lock is None:
+            self._tree_lock = asyncio.Lock()
+        async with self._tree_lock:
+            search = self.search
+            search._update_tree(search._rev_parse(rev))
+            tree = search.tree
+            if block.is_glob():
+                paths = tree.match(block.filename)
+            else:
+                prefix = block.filename.rstrip('/')
+                prefix = prefix + '/' if prefix else ''
+                paths = [path for path in tree.paths
+                        if path.startswith(prefix)]
+
+            if kind == 'blame':
+                contributed = self._lines_contributed
+            else:
+                contributed = self._lines_contributed_history
+            missing = [path for path in paths
+                    if (kind, path) not in tree.files]
+            found = await asyncio.gather(*[contributed(path, tree.rev)
+                for path in missing])
+            tree.files.update(((kind, path), contributions)
+                    for path, contributions in zip(missing, found))
+            return search._tree_contributions(kind, block, tree.rev)
+
+    async def _git_lines(self, command, *args, **kwargs):
+        """
+        Run the git command with the given arguments, as Search._git_lines
+        does, and return the lines of its output. Raises GitCommandError if
+        git fails.
+        """
+
+        repo = self.search.repo
+        argv = [repo.git.GIT_PYTHON_GIT_EXECUTABLE, command.replace('_', '-')]
+        argv.extend(repo.git.transform_kwargs(**kwargs))
+        argv.extend(args)
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        async with self._semaphore:
+            start = stats.timer()
+            proc = await asyncio.create_subprocess_exec(*argv,
+                    cwd=repo.working_dir, stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE)
+            stdout, stderr = await proc.communicate()
+            if self.search.stats is not None:
+                self.search.stats.add_git(command, stats.timer() - start,
+                        len(stdout))
+
+        if proc.returncode != 0:
+            raise git.GitCommandError(argv, proc.returncode, stderr)
+        # Every line ends in a newline, so the last piece is empty.
+        return [safe_decode(line) for line in stdout.split(b'\n')[:-1]]
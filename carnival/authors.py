@@ -0,0 +1,145 @@
+import re
+
+class Person(object):
+    # There may be very many people in a big repository.
+    __slots__ = ('name', 'email')
+
+    def __init__(self, name=None, email=None):
+        self.name = name
+        self.email = email
+
+    def __eq__(self, person):
+        return (isinstance(person, Person) and self.name == person.name and
+                self.email == person.email)
+
+    def __ne__(self, person):
+        return not self == person
+
+    def __hash__(self):
+        return hash((self.name, self.email))
+
+    def __getstate__(self):
+        # Without __dict__, Python 2 can't pickle us with the old protocols.
+        return (self.name, self.email)
+
+    def __setstate__(self, state):
+        self.name, self.email = state
+
+    def __str__(self):
+        return "Name: %s, Email: %s" % (self.name, self.email)
+
+    def __repr__(self):
+        return object.__repr__(self) + (" (Name: %s, Email: %s)" % (self.name, self.email))
+
+class Registry(object):
+    """
+    The people seen in a repository, indexed by (name, email), by name and by
+    email, so that finding the Person for an author doesn't mean scanning
+    everyone we've seen so far.
+
+    There is exactly one Person object per person in a Registry, so Person
+    objects from the same Registry can be used as dict keys and compared by
+    identity.
+
+    If a mailmap is given, identities are first mapped to the person's proper
+    identity, so that scores merge per real person.
+    """
+
+    def __init__(self, mailmap=None):
+        self.mailmap = mailmap
+        self.people = []
+
+        self._by_identity = {}  # {(name, email): Person}
+        self._by_name = {}      # {name: Person}
+        self._by_email = {}     # {email: Person}
+
+    def __iter__(self):
+        return iter(self.people)
+
+    def __len__(self):
+        return len(self.people)
+
+    def find(self, name=None, email=None, add=False):
+        """
+        Find the person with given name and/or email. A person matches on both
+        name and email, then on name alone, then on email alone. If the person
+        does not exist, add the person if add is True, otherwise return None.
+        """
+
+        identity = (name, email)
+        person = self._by_identity.get(identity)
+        if person is not None:
+            return person
+
+        if self.mailmap:
+            name, email = self.mailmap.resolve(name, email)
+            person = self._by_identity.get((name, email))
+
+        if person is None and name:
+            person = self._by_name.get(name)
+        if person is None and email:
+            person = self._by_email.get(email)
+
+        if person is None:
+            if not add:
+                return None
+            person = Person(name, email)
+            self.people.append(person)
+            self._by_identity[(name, email)] = person
+            if name:
+                self._by_name.setdefault(name, person)
+            if email:
+                self._by_email.setdefault(email, person)
+
+        # Remember how we got here, so next time is a single lookup.
+        self._by_identity[identity] = person
+        return person
+
+class Mailmap(object):
+    """
+    The alias to proper identity mapping of a .mailmap file. See "man
+    gitmailmap" for the format. Like git, we match names and emails without
+    regard to case.
+    """
+
+    def __init__(self, text=''):
+        self._map = {}  # {(commit name or None, commit email): (name, email)}
+        for line in text.splitlines():
+            self._add_line(line)
+
+    def __len__(self):
+        return len(self._map)
+
+    def resolve(self, name, email):
+        """
+        Return the proper (name, email) for the given name and email.
+        """
+
+        key = (email or '').lower()
+        proper = (self._map.get(((name or '').lower(), key)) or
+                self._map.get((None, key)))
+        if proper is None:
+            return name, email
+
+        proper_name, proper_email = proper
+        return proper_name or name, proper_email or email
+
+    def _add_line(self, line):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            return
+
+        entries = [(n.strip() or None, e.strip())
+                for n, e in _MAILMAP_ENTRY_RE.findall(line)]
+        if len(entries) == 1:
+            # Proper Name <commit@email>
+            proper_name, email = entries[0]
+            self._map[(None, email.lower())] = (proper_name, None)
+        elif len(entries) >= 2:
+            # [Proper Name] <proper@email> [Commit Name] <commit@email>
+            (proper_name, proper_email), (name, email) = entries[:2]
+            if name:
+                name = name.lower()
+            self._map[(name, email.lower())] = (proper_name, proper_email)
+
+_MAILMAP_ENTRY_RE = re.compile(r'([^<]*)<([^>]*)>')
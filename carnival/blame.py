@@ -0,0 +1,72 @@
+"""
+A streaming parser for the output of git blame --incremental.
+
+The output is a sequence of groups of lines that come from the same commit:
+
+    <sha> <line in original file> <line in final file> <number of lines>
+    author Bob
+    author-mail <bob@example.com>
+    ...
+    filename path/to/file
+
+The header lines (author, author-mail and so on) are only given the first
+time a commit shows up, so we remember them and hand them out with every
+group of that commit. See "man git-blame" for the details.
+"""
+
+from . import util
+
+class Group(object):
+    """
+    A group of lines of the final file that come from the same commit.
+
+    headers is a dict of the header lines of the commit, e.g.
+    {'author': 'Bob', 'author-mail': '<bob@example.com>', ...}. It is shared
+    between all groups of the same commit.
+    """
+
+    def __init__(self, sha, orig, final, count, headers):
+        self.sha = sha
+        self.orig = orig
+        self.final = final
+        self.count = count
+        self.headers = headers
+        self.filename = None
+
+    def author(self):
+        """
+        Return (name, email) of the author of the commit.
+        """
+        email = self.headers.get('author-mail', '').strip('<').strip('>')
+        return self.headers.get('author'), email
+
+
+def parse_incremental(lines):
+    """
+    Given an iterable of lines of git blame --incremental output, yield a
+    Group as soon as its lines have been read.
+
+    Only the headers of each commit are kept between groups, so memory use
+    depends on the number of commits, not the size of the file.
+    """
+
+    headers_by_sha = {}
+    group = None
+
+    for line in lines:
+        if group is None:
+            # We are at the first line of a group.
+            sha, orig, final, count = line.split()
+            sha = util.intern(sha)
+            headers = headers_by_sha.setdefault(sha, {})
+            group = Group(sha, int(orig), int(final), int(count), headers)
+            continue
+
+        key, _, value = line.partition(' ')
+        if key == 'filename':
+            # The filename marks the end of the group.
+            group.filename = util.unquote_path(value)
+            yield group
+            group = None
+        else:
+            group.headers[key] = value
@@ -0,0 +1,173 @@
+"""
+A persistent cache for the results of git work.
+
+Everything we compute from git is a function of a commit hash (and a path),
+and a commit hash names an immutable snapshot of the repository. So the
+results can be kept on disk and reused across Search objects, processes and
+restarts without ever going stale. Names like HEAD must be resolved to a
+commit hash before they are used as a key.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Bump this when the layout of stored values changes, so that old caches are
+# ignored instead of misread.
+VERSION = 2
+
+# How long, in seconds, an entry counts as just used after it was last read.
+# Reading it again within that time doesn't write down the time it was used,
+# so that repeated reads of a warm cache don't write to it at all.
+TOUCH_INTERVAL = 10 * 60
+
+class Cache(object):
+    """
+    An SQLite backed key value store, keyed by (kind, rev, path).
+
+    kind tells apart the different things we store (for example 'blame'), rev
+    is a commit hash and path is a path in the repository, or '' if the value
+    is about the whole commit. Values are anything json can serialize.
+
+    The total size of the stored values is kept under max_size bytes by
+    evicting the least recently used entries. The total is kept up to date by
+    SQLite itself, for every process using the cache, so it never has to be
+    counted again. Reads only mark entries as used if they weren't in the
+    last TOUCH_INTERVAL seconds.
+    """
+
+    def __init__(self, directory, max_size=64 * 1024 * 1024):
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.path = os.path.join(directory, 'carnival-%d.sqlite' % VERSION)
+        self.max_size = max_size
+
+        # One connection, shared between threads under a lock. Other processes
+        # may use the same file; SQLite does the locking between them.
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, timeout=60,
+                check_same_thread=False)
+        # So that the rows INSERT OR REPLACE replaces go through the delete
+        # trigger, and leave the total.
+        self._db.execute("PRAGMA recursive_triggers = ON")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS entries (
+                kind TEXT NOT NULL,
+                rev TEXT NOT NULL,
+                path TEXT NOT NULL,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                used REAL NOT NULL,
+                PRIMARY KEY (kind, rev, path));
+            CREATE INDEX IF NOT EXISTS entries_used ON entries (used);
+            CREATE TABLE IF NOT EXISTS total (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                size INTEGER NOT NULL);
+            INSERT OR IGNORE INTO total VALUES (0, 0);
+            CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries
+            BEGIN
+                UPDATE total SET size = size + NEW.size;
+            END;
+            CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries
+            BEGIN
+                UPDATE total SET size = size - OLD.size;
+            END;
+            """)
+
+    def get(self, kind, rev, path=''):
+        """
+        Return the value stored for (kind, rev, path), or None.
+        """
+        return self.get_many(kind, [rev], path).get(rev)
+
+    def get_many(self, kind, revs, path=''):
+        """
+        Return a dict {rev: value} of the values stored for (kind, rev, path),
+        for every rev in revs that has one.
+        """
+
+        values = {}
+        now = time.time()
+        touched = []
+        with self._lock:
+            for rev in set(revs):
+                row = self._db.execute("SELECT value, used FROM entries "
+                        "WHERE kind = ? AND rev = ? AND path = ?",
+                        (kind, rev, path)).fetchone()
+                if row is None:
+                    continue
+                values[rev] = json.loads(row[0])
+                if now - row[1] > TOUCH_INTERVAL:
+                    touched.append((now, kind, rev, path))
+            if touched:
+                with self._db:
+                    self._db.executemany("UPDATE entries SET used = ? "
+                            "WHERE kind = ? AND rev = ? AND path = ?", touched)
+        return values
+
+    def put(self, kind, rev, value, path=''):
+        """
+        Store value for (kind, rev, path).
+        """
+        self.put_many(kind, {rev: value}, path)
+
+    def put_many(self, kind, values, path=''):
+        """
+        Given a dict {rev: value}, store each value for (kind, rev, path).
+        """
+
+        now = time.time()
+        rows = []
+        for rev, value in values.items():
+            value = json.dumps(value, separators=(',', ':'))
+            rows.append((kind, rev, path, value, len(value), now))
+
+        with self._lock:
+            with self._db:
+                self._db.executemany("INSERT OR REPLACE INTO entries "
+                        "(kind, rev, path, value, size, used) "
+                        "VALUES (?, ?, ?, ?, ?, ?)", rows)
+                self._evict()
+
+    def size(self):
+        """
+        Return the total size of the stored values, in bytes.
+        """
+        with self._lock:
+            return self._size()
+
+    def clear(self):
+        with self._lock:
+            with self._db:
+                self._db.execute("DELETE FROM entries")
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _size(self):
+        return self._db.execute("SELECT size FROM total").fetchone()[0]
+
+    def _evict(self):
+        """
+        Drop the least recently used entries until we are under max_size.
+
+        We go a little further than that, down to 90% of max_size, so that we
+        don't have to evict again on the very next put.
+        """
+
+        excess = self._size() - self.max_size
+        if excess <= 0:
+            return
+        excess += self.max_size // 10
+
+        doomed = []
+        for rowid, size in self._db.execute(
+                "SELECT rowid, size FROM entries ORDER BY used"):
+            if excess <= 0:
+                break
+            doomed.append((rowid,))
+            excess -= size
+        self._db.executemany("DELETE FROM entries WHERE rowid = ?", doomed)
@@ -0,0 +1,153 @@
+"""
+Long-lived git cat-file processes.
+
+Running git once per object we want to look at costs a fork and exec every
+time, which adds up quickly for files with many small commits. git cat-file
+--batch instead reads object names from stdin and writes the objects to
+stdout, one after the other, so one process can serve any number of reads.
+"""
+
+import contextlib
+import subprocess
+import threading
+
+from git.compat import safe_decode
+
+from . import stats as _stats
+
+class Pool(object):
+    """
+    A pool of up to size git cat-file --batch processes for repo, started as
+    they are needed. The pool can be used from many threads at once; every
+    thread gets a process to itself for the duration of each read.
+
+    If stats, a stats.Stats, is given, every read is recorded in it as a run
+    of cat-file.
+    """
+
+    def __init__(self, repo, size=4, stats=None):
+        self.repo = repo
+        self.size = size
+        self.stats = stats
+
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+        self._procs = set()     # Every process we started and haven't closed.
+        self._idle = []         # Those not in use right now.
+
+    def read(self, name):
+        """
+        Return (sha, type, data) of the object with the given name, which can
+        be anything git rev-parse accepts, e.g. 'HEAD' or 'HEAD:README'.
+        Raises KeyError if there is no such object.
+        """
+
+        if not isinstance(name, bytes):
+            name = name.encode('utf-8')
+
+        start = _stats.timer() if self.stats is not None else None
+        found = None
+        with self._process() as proc:
+            proc.stdin.write(name + b'\n')
+            proc.stdin.flush()
+
+            header = safe_decode(proc.stdout.readline()).split()
+            if len(header) == 3:
+                sha, type, size = header
+                data = proc.stdout.read(int(size))
+                proc.stdout.read(1)     # The newline after the object.
+                found = sha, type, data
+
+        if self.stats is not None:
+            self.stats.add_git('cat_file', _stats.timer() - start,
+                    len(found[2]) if found else 0)
+        if found is None:
+            # "<name> missing" or "<name> ambiguous".
+            raise KeyError(safe_decode(name))
+        return found
+
+    def commit(self, name):
+        """
+        Return the Commit with the given name.
+        """
+        sha, type, data = self.read(name + '^{commit}')
+        return Commit(sha, data)
+
+    def close(self):
+        """
+        Stop all processes. Processes in use are stopped once they are handed
+        back. The pool starts new ones if it is used again.
+        """
+        with self._lock:
+            idle, self._idle = self._idle, []
+            self._procs.clear()
+        for proc in idle:
+            self._stop(proc)
+
+    @contextlib.contextmanager
+    def _process(self):
+        """
+        Hand out an idle process, starting one if there are none, or wait
+        for one if all size processes are in use.
+        """
+
+        with self._slots:
+            with self._lock:
+                proc = self._idle.pop() if self._idle else None
+            if proc is None:
+                proc = self.repo.git.cat_file(batch=True, as_process=True,
+                        istream=subprocess.PIPE)
+                with self._lock:
+                    self._procs.add(proc)
+
+            try:
+                yield proc
+            except Exception:
+                # We may have left the process half way through an object, so
+                # it is of no use anymore.
+                with self._lock:
+                    self._procs.discard(proc)
+                self._stop(proc)
+                raise
+
+            with self._lock:
+                if proc in self._procs:
+                    self._idle.append(proc)
+                    proc = None
+            if proc is not None:
+                # The pool was closed while we had it.
+                self._stop(proc)
+
+    def _stop(self, proc):
+        # cat-file exits once its input ends.
+        proc.stdin.close()
+        proc.proc.wait()
+
+
+class Commit(object):
+    """
+    The headers of a commit object we care about.
+    """
+
+    def __init__(self, sha, data):
+        self.sha = sha
+        self.tree = None
+        self.parents = []
+        self.author_name = self.author_email = self.author_time = None
+
+        for line in safe_decode(data).split('\n'):
+            if not line:
+                # The headers end at the first empty line.
+                break
+            key, _, value = line.partition(' ')
+            if key == 'tree':
+                self.tree = value
+            elif key == 'parent':
+                self.parents.append(value)
+            elif key == 'author':
+                # author Bob <bob@example.com> 1280285449 -0500
+                ident, time, tz = value.rsplit(' ', 2)
+                name, _, email = ident.partition(' <')
+                self.author_name = name
+                self.author_email = email.rstrip('>')
+                self.author_time = int(time)
@@ -0,0 +1,48 @@
+"""
+Churn: the lines each commit added to and removed from each path.
+
+The score_* methods of Search find the lines each author wrote that are, or
+were, part of a block, which takes a blame or a diff per block. For a quick
+ranking of many files, counting the lines each author added and removed is
+often good enough, and the counts of every path come out of one pass over
+the history of the whole repository:
+
+    git log --numstat HEAD
+
+Churn holds those counts. Search builds it and scores from it.
+"""
+
+import fnmatch
+
+class Churn(object):
+    """
+    rev is the commit hash the churn is counted up to. changes is a dict
+    {path: [(Person, time, added, removed)]}, with one entry for every commit
+    that changed path, time being the unix time of the commit. Paths that
+    were deleted since are kept.
+    """
+
+    def __init__(self, rev):
+        self.rev = rev
+        self.changes = {}
+
+    def add_commit(self, person, commit):
+        """
+        Add the lines added and removed by a history.Commit made by person.
+        """
+        for path in set(commit.added) | set(commit.removed):
+            self.changes.setdefault(path, []).append((person, commit.time,
+                commit.added.get(path, 0), commit.removed.get(path, 0)))
+
+    def paths(self, name, glob=False):
+        """
+        Return the paths name stands for: those matching it if it is a glob
+        pattern (glob is True), the paths under it if it ends in '/', or just
+        name.
+        """
+        if glob:
+            return [path for path in self.changes if
+                    fnmatch.fnmatchcase(path, name)]
+        if name.endswith('/'):
+            return [path for path in self.changes if path.startswith(name)]
+        return [name] if name in self.changes else []
@@ -0,0 +1,169 @@
+"""
+The carnival command.
+
+    $ carnival --repo /path/to/repository src/main.py src/util.py:10,40
+    $ git ls-files | carnival --method last_commit --format csv --top 3
+
+scores every block given, or read one per line from --input (or standard
+input, if no blocks are given), and writes the scores of each as soon as it
+is done: a JSON object per line, or CSV rows. A block is a path, a directory
+ending in '/', 'glob:' followed by a glob pattern, e.g. 'glob:src/*.py', or a
+path followed by a range of lines as in git blame -L, e.g. 'src/util.py:10,40'.
+
+A block that can't be scored, e.g. because it doesn't exist, gets an error
+instead: a JSON object with the block and the error, or a message on standard
+error with CSV. The other blocks are still scored, and the command exits with
+status 1 at the end.
+
+GitPython and the rest of carnival are only imported once the arguments are
+read, so that --help and mistakes come back right away.
+"""
+
+import argparse
+import itertools
+import json
+import re
+import sys
+
+METHODS = ('last_commit', 'all_commits', 'all_commits_over_time', 'churn')
+
+_RANGE_RE = re.compile(r'^(.*):(\d*),(\d*)$')
+
+def parse_block(line):
+    """
+    Return the search.Block named by line.
+    """
+
+    from . import search
+
+    match = _RANGE_RE.match(line)
+    if match is None:
+        return search.Block.of(line)
+    path, start, end = match.groups()
+    return search.Block(path, int(start) if start else None,
+            int(end) if end else None)
+
+def read_blocks(lines):
+    """
+    Yield the Blocks named by lines, one per line, skipping empty ones.
+    """
+    for line in lines:
+        line = line.strip()
+        if line:
+            yield parse_block(line)
+
+def score(s, blocks, method, workers=1, timenow=None):
+    """
+    Yield (block, {Person: score}) for every block, as it is scored by the
+    Search s, or (block, the exception) if it can't be scored.
+    """
+    import git
+
+    if method == 'churn':
+        for block in blocks:
+            try:
+                yield block, s.score_churn(block, timenow=timenow)
+            except (git.GitCommandError, KeyError, ValueError) as e:
+                yield block, e
+    else:
+        for result in s.score_each(blocks, method=method, workers=workers,
+                timenow=timenow, errors=True):
+            yield result
+
+def error_message(error):
+    """
+    Return a one-line description of the exception error.
+    """
+    if isinstance(error, KeyError):
+        # str() of a KeyError is the repr() of its argument.
+        error = error.args[0] if error.args else error
+    return ' '.join(str(error).split())
+
+def write_json(out, block, scores):
+    out.write(json.dumps({'block': str(block), 'scores': [{'name':
+        person.name, 'email': person.email, 'score': score}
+        for person, score in scores]}) + '\n')
+
+def main(argv=None, stdin=None, stdout=None):
+    stdin = stdin or sys.stdin
+    stdout = stdout or sys.stdout
+
+    parser = argparse.ArgumentParser(prog='carnival',
+            description="Find who knows what in a git repository.")
+    parser.add_argument('blocks', nargs='*', metavar='BLOCK',
+            help="a path, directory/, glob:pattern or path:start,end")
+    parser.add_argument('--input', metavar='FILE',
+            help="read blocks from FILE, one per line ('-' for standard input)")
+    parser.add_argument('--repo', default='.',
+            help="the repository (default: the current directory)")
+    parser.add_argument('--method', choices=METHODS, default='all_commits')
+    parser.add_argument('--format', choices=('jsonl', 'csv'), default='jsonl')
+    parser.add_argument('--top', type=int, metavar='K',
+            help="only give the K best people of every block")
+    parser.add_argument('--timenow', type=float,
+            help="age commits as of this unix time (default: now)")
+    parser.add_argument('--workers', type=int, default=1,
+            help="score blocks in this many processes")
+    parser.add_argument('--mailmap', action='store_true',
+            help="merge authors using the repository's .mailmap")
+    parser.add_argument('--cache-dir', help="keep a persistent cache here")
+    parser.add_argument('--index', help="use the expertise index in this file")
+    args = parser.parse_args(argv)
+
+    opened = None
+    if args.input == '-' or (args.input is None and not args.blocks):
+        lines = stdin
+    elif args.input is not None:
+        lines = opened = open(args.input)
+    else:
+        lines = []
+
+    # Only now, since this imports GitPython.
+    import git
+    from . import search
+
+    # Blocks are read as they are needed, so scoring starts right away.
+    blocks = itertools.chain(read_blocks(args.blocks), read_blocks(lines))
+
+    if args.format == 'csv':
+        import csv
+        writer = csv.writer(stdout)
+        writer.writerow(['block', 'name', 'email', 'score'])
+
+    failed = False
+    try:
+        with search.Search(args.repo, mailmap=args.mailmap,
+                cache_dir=args.cache_dir, index_path=args.index) as s:
+            for block, scores in score(s, blocks, args.method,
+                    workers=args.workers, timenow=args.timenow):
+                if isinstance(scores, Exception):
+                    failed = True
+                    message = error_message(scores)
+                    if args.format == 'csv':
+                        sys.stderr.write('carnival: %s: %s\n' % (block,
+                            message))
+                    else:
+                        stdout.write(json.dumps({'block': str(block),
+                            'error': message}) + '\n')
+                    stdout.flush()
+                    continue
+                scores = search.top(scores, len(scores) if args.top is None
+                        else args.top)
+                if args.format == 'csv':
+                    for person, value in scores:
+                        writer.writerow([str(block), person.name,
+                            person.email, value])
+                else:
+                    write_json(stdout, block, scores)
+                stdout.flush()
+    except (git.GitCommandError, git.exc.NoSuchPathError,
+            git.exc.InvalidGitRepositoryError) as e:
+        sys.stderr.write('carnival: %s\n' % e)
+        return 1
+    finally:
+        if opened is not None:
+            opened.close()
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
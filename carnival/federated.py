@@ -0,0 +1,160 @@
+"""
+Expert search across many repositories at once.
+
+A Search knows one repository. FederatedSearch keeps a Search per repository
+and asks all of them at the same time, each in a thread of its own, so a
+query takes about as long as it does in the slowest repository, not as long
+as all of them together. Most of the work is done by git, outside Python, so
+threads are enough to keep it going in parallel.
+
+The people found in every repository are merged into one authors.Registry,
+so that someone who committed to several repositories is one Person. The
+overall ranking weighs every repository by the lines contributed to the
+block in it, just as the files of a directory are weighed.
+"""
+
+import multiprocessing.pool
+
+import git
+
+from . import authors
+from . import search
+
+class FederatedSearch(object):
+    """
+    Searches the repositories in repos, a dict {name: path}, using up to
+    workers threads (one per repository by default). options are passed on
+    to every Search, e.g. cache_dir or mailmap.
+    """
+
+    def __init__(self, repos, workers=None, **options):
+        self.searches = dict((name, search.Search(path, **options))
+                for name, path in repos.items())
+        self.workers = workers or len(self.searches)
+        self.authors = authors.Registry()
+
+    def close(self):
+        for s in self.searches.values():
+            s.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def score(self, block, method='all_commits', timenow=None):
+        """
+        Returns a Ranking of the people of all repositories for block, using
+        the given method, as in Search.score_many. block is looked for in
+        every repository, or it is a dict {name: block} giving a block for
+        some of them.
+
+        A repository that hasn't got the block, or that git fails on, is left
+        out of the ranking, and the error is kept in Ranking.errors.
+        """
+
+        if isinstance(block, dict):
+            blocks = block
+        else:
+            blocks = dict((name, block) for name in self.searches)
+        contributions_method, aging = search.Search.METHODS[method]
+
+        def score_repo(name):
+            s = self.searches[name]
+            try:
+                contributions, num_lines_total = getattr(s,
+                        contributions_method)(blocks[name])
+                return name, s._score_author_contributions(contributions,
+                        timenow=timenow, aging=aging, normalize=False), None
+            except (git.GitCommandError, KeyError) as e:
+                return name, {}, e
+
+        names = [name for name in blocks if name in self.searches]
+        if len(names) > 1 and self.workers > 1:
+            pool = multiprocessing.pool.ThreadPool(min(self.workers,
+                len(names)))
+            try:
+                results = pool.map(score_repo, names)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = [score_repo(name) for name in names]
+
+        ranking = Ranking()
+        for name, scores, error in results:
+            if error is not None:
+                ranking.errors[name] = error
+                continue
+            # Each Search has its own Person objects, found from its own
+            # thread. Map them to ours now. Ours merge people by name or by
+            # email alone, so several of theirs can be one of ours.
+            merged = ranking.repos[name] = {}
+            for person, score in scores.items():
+                person = self._person(person)
+                merged[person] = merged.get(person, 0) + score
+        ranking.normalize()
+        return ranking
+
+    def top_experts(self, block, k=5, method='all_commits', timenow=None):
+        """
+        Returns the (Person, score) pairs of the k best people overall for
+        block, best first. See score.
+        """
+        return self.score(block, method=method, timenow=timenow).top(k)
+
+    def _person(self, person):
+        return self.authors.find(name=person.name, email=person.email,
+                add=True)
+
+
+class Ranking(object):
+    """
+    The scores of a federated query.
+
+    scores is a dict {Person: score} over all repositories, and repos is a
+    dict {name: {Person: score}} of the scores within each repository. Both
+    are normalized, as the scores of Search are. errors is a dict {name:
+    exception} of the repositories that were left out.
+    """
+
+    def __init__(self):
+        self.scores = {}
+        self.repos = {}
+        self.errors = {}
+
+    def normalize(self):
+        """
+        Sum the unnormalized scores in repos into scores, and normalize both.
+        """
+
+        self.scores = {}
+        for scores in self.repos.values():
+            for person, score in scores.items():
+                self.scores[person] = self.scores.get(person, 0) + score
+        _normalize(self.scores)
+        for scores in self.repos.values():
+            _normalize(scores)
+
+    def top(self, k):
+        """
+        Return the (Person, score) pairs of the k best people overall, best
+        first.
+        """
+        return search.top(self.scores, k)
+
+    def breakdown(self, person):
+        """
+        Return a dict {name: score} of the score of person in every
+        repository they have one in.
+        """
+        return dict((name, scores[person]) for name, scores in
+                self.repos.items() if person in scores)
+
+
+def _normalize(scores):
+    total = sum(scores.values())
+    if total:
+        for person, score in scores.items():
+            scores[person] = score / total
@@ -0,0 +1,157 @@
+"""
+Single-pass history attribution.
+
+Search._lines_contributed_for_revs blames the block once for every revision
+that touched it, and keeps only the lines blamed on that revision. Those are
+exactly the lines the revision added to the block, so we can get the same
+numbers by reading the block's history once as a stream of diffs:
+
+    git log -p --cc --reverse --format=<HEADER> HEAD -- block
+
+For a regular commit, the lines it added are the '+' lines of its diff
+against its parent. For a merge commit, blame only keeps the lines that are
+in none of the parents, which are the lines the dense combined diff (--cc)
+marks with a '+' in every parent column.
+"""
+
+from . import util
+
+# Every commit in the stream starts with a line holding these fields,
+# separated (and led) by NUL bytes. A line of diff output always starts with
+# a printable character, so the two can't be confused. %aN and %aE respect
+# .mailmap, like the author fields of git-blame.
+HEADER = '%x00%H%x00%at%x00%aN%x00%aE'
+
+# Keyword arguments for repo.git.log that produce the stream parse_log reads.
+# We don't need context lines to count additions, and rename detection is left
+# off so that the history matches the one given by git-rev-list for the path.
+# The prefixes of the diff headers are given, since diff.noprefix and
+# diff.mnemonicPrefix would change them.
+LOG_KWARGS = {
+        'format': HEADER,
+        'p': True,
+        'cc': True,
+        'reverse': True,
+        'unified': 0,
+        'no_renames': True,
+        'no_color': True,
+        'no_ext_diff': True,
+        'src_prefix': 'a/',
+        'dst_prefix': 'b/',
+        }
+
+
+# Keyword arguments for repo.git.log that produce the stream parse_numstat
+# reads: the number of lines added and removed per path, without the diffs.
+# Merges get no numstat, so their lines aren't counted twice.
+NUMSTAT_KWARGS = {
+        'format': HEADER,
+        'numstat': True,
+        'no_renames': True,
+        'no_color': True,
+        'no_ext_diff': True,
+        }
+
+
+class Commit(object):
+    """
+    A commit read from a history stream.
+
+    added is a dict {path: number of lines added to path by this commit}.
+    Paths the commit only removed lines from are not in added. removed is
+    the same for the lines removed, but only parse_numstat fills it in.
+    """
+
+    def __init__(self, sha, time, name, email):
+        self.sha = sha
+        self.time = time
+        self.name = name
+        self.email = email
+        self.added = {}
+        self.removed = {}
+
+    def num_lines(self):
+        """
+        Total number of lines this commit added.
+        """
+        return sum(self.added.values())
+
+
+def parse_log(lines):
+    """
+    Given an iterable of lines of git-log output produced with LOG_KWARGS,
+    yield a Commit for every commit in the stream, in stream order.
+    """
+
+    commit = None
+    path = None
+    parents = 0     # Number of parent columns in the current hunk.
+    in_hunk = False
+
+    for line in lines:
+        if line.startswith('\x00'):
+            if commit is not None:
+                yield commit
+            sha, time, name, email = line[1:].split('\x00')
+            commit = Commit(util.intern(sha), int(time), name, email)
+            path = None
+            in_hunk = False
+        elif in_hunk and line[:parents] == '+' * parents:
+            # Added in respect to every parent.
+            commit.added[path] = commit.added.get(path, 0) + 1
+        elif line.startswith('@@'):
+            parents = len(line) - len(line.lstrip('@')) - 1
+            in_hunk = path is not None
+        elif line.startswith('diff '):
+            # A new file header. Hunk lines can't start with 'diff ', since the
+            # first columns of a hunk line are always ' ', '+' or '-'.
+            path = None
+            in_hunk = False
+        elif not in_hunk and line.startswith('+++ '):
+            path = _diff_path(line[4:])
+
+    if commit is not None:
+        yield commit
+
+
+def parse_numstat(lines):
+    """
+    Given an iterable of lines of git-log output produced with
+    NUMSTAT_KWARGS, yield a Commit for every commit in the stream, with both
+    added and removed filled in. Binary files, which have no lines, are left
+    out.
+    """
+
+    commit = None
+
+    for line in lines:
+        if line.startswith('\x00'):
+            if commit is not None:
+                yield commit
+            sha, time, name, email = line[1:].split('\x00')
+            commit = Commit(util.intern(sha), int(time), name, email)
+        elif line and commit is not None:
+            # <added> TAB <removed> TAB <path>, with '-' for binary files.
+            added, removed, path = line.split('\t', 2)
+            if added == '-':
+                continue
+            path = util.unquote_path(path)
+            if int(added):
+                commit.added[path] = int(added)
+            if int(removed):
+                commit.removed[path] = int(removed)
+
+    if commit is not None:
+        yield commit
+
+
+def _diff_path(name):
+    """
+    Given the file name of a '+++' diff header line, return the path in the
+    repository, or None if the file was deleted.
+    """
+    if name == '/dev/null':
+        return None
+    name = util.unquote_path(name.rstrip('\t'))
+    # Strip the b/ destination prefix.
+    return name.split('/', 1)[1]
@@ -0,0 +1,209 @@
+"""
+A persistent expertise index of a whole repository.
+
+The index holds, for every path, the lines each commit added to it (what
+score_all_commits and score_all_commits_over_time need) and the lines of the
+path each commit owns at head (what score_last_commit needs), plus the
+author and time of every commit. It records the commit it was built at, so
+it can be brought up to date by looking at the new commits only.
+
+The index only holds data. Search builds, refreshes and reads it.
+
+A whole repository makes for a lot of (path, commit) pairs, so the index
+keeps them compactly: every commit gets a small integer id, and the
+contributions of each path are a flat array of (commit id, number of lines)
+pairs rather than a dict of commit hashes. The commit hashes themselves are
+packed into one string of 20 bytes per commit, and the author and time of
+each commit are arrays indexed by commit id. Only changing the index needs
+to look commits up by hash, so the dicts for that aren't saved, but made
+again when the index is first changed.
+"""
+
+import array
+import binascii
+import os
+import tempfile
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+from . import util
+
+# Bump this when the layout changes, so that old index files get rebuilt
+# instead of misread.
+VERSION = 2
+
+class Index(object):
+    """
+    head is the commit hash the index is up to date with.
+
+    history is a dict {path: array of (commit id, number of lines added)
+    pairs}, over all commits up to head. blame is a dict {path: array of
+    (commit id, number of lines) pairs}, for the lines of path at head. Paths
+    that haven't been blamed yet are missing from blame. Use rows to read
+    them.
+    """
+
+    def __init__(self):
+        self.head = None
+        self.history = {}
+        self.blame = {}
+
+        self.commits = bytearray()          # 20-byte commit hashes, by commit id
+        self.people = []                    # [(name, email)]
+        self.authors = array.array('i')     # [index into people], by commit id
+        self.datetimes = array.array('l')   # [unix time], by commit id
+
+        # Made when first needed; see _lookups.
+        self._commit_ids = None     # {20-byte commit hash: commit id}
+        self._person_ids = None     # {(name, email): index into people}
+
+    def add_commit(self, commit):
+        """
+        Add the lines added by a history.Commit.
+        """
+
+        commit_id = self._commit_id(commit.sha, commit.name, commit.email,
+                commit.time)
+        for path, num_lines in commit.added.items():
+            if num_lines:
+                pairs = self.history.get(path)
+                if pairs is None:
+                    pairs = self.history[path] = array.array('I')
+                pairs.extend((commit_id, num_lines))
+
+    def set_blame(self, path, rows):
+        """
+        Given the (sha, name, email, num_lines) rows of the lines of path at
+        head, save them.
+        """
+
+        pairs = array.array('I')
+        for sha, name, email, num_lines in rows:
+            pairs.extend((self._commit_id(sha, name, email), num_lines))
+        self.blame[path] = pairs
+
+    def forget_blame(self, paths):
+        """
+        Forget what we know about the lines at head of the given paths, e.g.
+        because they changed since.
+        """
+        for path in paths:
+            self.blame.pop(path, None)
+
+    def rows(self, kind, path):
+        """
+        Return the (sha, name, email, num_lines, time) rows of the given kind
+        ('history' or 'blame') for path, or None if the index doesn't know.
+        time is the unix time of the commit, or None if it isn't known.
+        """
+
+        pairs = getattr(self, kind).get(path)
+        if pairs is None:
+            return None
+
+        rows = []
+        for i in range(0, len(pairs), 2):
+            commit_id, num_lines = pairs[i], pairs[i + 1]
+            name, email = self.people[self.authors[commit_id]]
+            sha = binascii.hexlify(
+                    self.commits[commit_id * 20:commit_id * 20 + 20])
+            rows.append((util.intern(sha.decode('ascii')), name, email,
+                num_lines, self.datetimes[commit_id] or None))
+        return rows
+
+    def person_lines(self, kind, path):
+        """
+        Like rows, but return (person id, num_lines, time) rows, where person
+        id is an index into people. This skips making the commit hashes, for
+        callers that only want to know who contributed.
+        """
+
+        pairs = getattr(self, kind).get(path)
+        if pairs is None:
+            return None
+
+        rows = []
+        for i in range(0, len(pairs), 2):
+            commit_id, num_lines = pairs[i], pairs[i + 1]
+            rows.append((self.authors[commit_id], num_lines,
+                self.datetimes[commit_id] or None))
+        return rows
+
+    def save(self, filename):
+        """
+        Save the index to filename. The file is replaced all at once, so a
+        reader never sees half an index.
+        """
+
+        state = dict(self.__dict__, _commit_ids=None, _person_ids=None)
+        directory = os.path.dirname(os.path.abspath(filename))
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix='.carnival-index-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump((VERSION, state), f, pickle.HIGHEST_PROTOCOL)
+            os.rename(tmp, filename)
+        except Exception:
+            os.remove(tmp)
+            raise
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Return the index saved in filename, or None if there is no such file,
+        or it was saved by an incompatible version.
+        """
+
+        try:
+            with open(filename, 'rb') as f:
+                version, state = pickle.load(f)
+        except (IOError, OSError):
+            return None
+        if version != VERSION:
+            return None
+
+        index = cls()
+        index.__dict__.update(state)
+        return index
+
+    def _commit_id(self, sha, name, email, time=None):
+        """
+        Return the id of the commit with hash sha, by name and email, adding
+        it if it is new.
+        """
+
+        if self._commit_ids is None:
+            self._lookups()
+
+        key = bytes(binascii.unhexlify(sha))
+        commit_id = self._commit_ids.get(key)
+        if commit_id is not None:
+            if time and not self.datetimes[commit_id]:
+                self.datetimes[commit_id] = time
+            return commit_id
+
+        identity = (name, email)
+        person_id = self._person_ids.get(identity)
+        if person_id is None:
+            person_id = self._person_ids[identity] = len(self.people)
+            self.people.append(identity)
+
+        commit_id = self._commit_ids[key] = len(self.authors)
+        self.commits.extend(key)
+        self.authors.append(person_id)
+        self.datetimes.append(time or 0)    # 0 for not known.
+        return commit_id
+
+    def _lookups(self):
+        """
+        Make the dicts to look up commits and people by.
+        """
+
+        self._commit_ids = {}
+        for commit_id in range(len(self.authors)):
+            key = bytes(self.commits[commit_id * 20:commit_id * 20 + 20])
+            self._commit_ids[key] = commit_id
+        self._person_ids = dict((identity, person_id)
+                for person_id, identity in enumerate(self.people))
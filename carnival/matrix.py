@@ -0,0 +1,102 @@
+"""
+Vectorised scoring with NumPy.
+
+Search._score_author_contributions ages and sums contributions one commit at
+a time, for one point in time and one decay rate. Here contributions are
+held as arrays instead, one entry per commit:
+
+    times       when the commit was made (unix time)
+    num_lines   how many lines it contributed
+    authors     who made it, as an index into people
+
+so that scores for a whole grid of decay rates and points in time come out
+of a few array operations. NumPy is optional; only this module needs it.
+"""
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+SECONDS_PER_DAY = 60 * 60 * 24
+
+class ContributionMatrix(object):
+    def __init__(self, people, times, num_lines, authors):
+        if numpy is None:
+            raise ImportError("ContributionMatrix needs numpy")
+
+        self.people = people
+        self.times = numpy.asarray(times, dtype=numpy.float64)
+        self.num_lines = numpy.asarray(num_lines, dtype=numpy.float64)
+        self.authors = numpy.asarray(authors, dtype=numpy.intp)
+
+    @classmethod
+    def from_contributions(cls, contributions, datetimes):
+        """
+        Make a ContributionMatrix out of contributions, a dict
+        {commit hash: Contribution}, given the dict
+        {commit hash: unix time} of their commits.
+        """
+
+        people = []
+        person_ids = {}
+        times, num_lines, authors = [], [], []
+        for sha, contribution in contributions.items():
+            person = contribution.person
+            if person not in person_ids:
+                person_ids[person] = len(people)
+                people.append(person)
+            times.append(datetimes[sha])
+            num_lines.append(contribution.num_lines)
+            authors.append(person_ids[person])
+        return cls(people, times, num_lines, authors)
+
+    def scores(self, lmbs, timenows, min_val=0.1, normalize=True):
+        """
+        Return an array of shape (len(lmbs), len(timenows), len(people)) of
+        the score of each person, for every decay rate in lmbs and point in
+        time in timenows, aged as in Search._aging_exp. A decay rate of None
+        means no aging at all.
+        """
+
+        # days[t, c] is the age of commit c at timenows[t].
+        timenows = numpy.asarray(timenows, dtype=numpy.float64)
+        days = (timenows[:, None] - self.times[None, :]) / SECONDS_PER_DAY
+
+        weights = numpy.empty((len(lmbs), len(timenows), len(self.times)))
+        for l, lmb in enumerate(lmbs):
+            if lmb is None:
+                weights[l] = 1.0
+            else:
+                numpy.maximum(numpy.exp(-days * lmb), min_val, out=weights[l])
+        weights *= self.num_lines
+
+        # Sum the weights of each author's commits: row r of the flattened
+        # (lmb, timenow) grid adds to bin r * len(people) + author.
+        num_rows = len(lmbs) * len(timenows)
+        num_people = len(self.people)
+        bins = (numpy.arange(num_rows)[:, None] * num_people +
+                self.authors[None, :])
+        scores = numpy.bincount(bins.ravel(), weights=weights.ravel(),
+                minlength=num_rows * num_people)
+        # Without any commits, bincount gives integers.
+        scores = scores.astype(numpy.float64, copy=False).reshape(
+                (len(lmbs), len(timenows), num_people))
+
+        if normalize:
+            totals = scores.sum(axis=2, keepdims=True)
+            numpy.divide(scores, totals, out=scores, where=totals != 0)
+        return scores
+
+    def score_dicts(self, lmbs, timenows, min_val=0.1, normalize=True):
+        """
+        Like scores, but return a dict {(lmb, timenow): {Person: score}}.
+        """
+
+        scores = self.scores(lmbs, timenows, min_val, normalize)
+        grid = {}
+        for l, lmb in enumerate(lmbs):
+            for t, timenow in enumerate(timenows):
+                grid[(lmb, timenow)] = dict(zip(self.people,
+                    scores[l, t].tolist()))
+        return grid
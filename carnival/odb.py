@@ -0,0 +1,227 @@
+"""
+Blame in process, from the object database.
+
+git blame is a process of its own for every file and revision, and its output
+has to be parsed back. Blamer does the same work in process instead: it reads
+commits, trees and blobs straight from the repository's object database
+(GitPython's GitDB, when the repo was opened with odbt=git.GitDB) and finds
+where every line comes from with difflib.
+
+Starting from the file at the given revision, lines are handed from a commit
+to its parents as long as the parent has them too, newest commit first. The
+lines no parent has were added by that commit. A parent with the very same
+blob takes all of a commit's lines at once, without a diff. As in git blame,
+renames aren't followed.
+
+The blobs read, and the diffs between them, are kept, so that blaming the same
+file at another revision, or another file with a shared history, only diffs
+what it hasn't seen yet.
+
+Authors are as written in the commits; use Search(mailmap=True) to have them
+mapped the way git blame would. difflib doesn't always split a change the
+same way as git's diff, so where a change can be read more than one way,
+lines may be blamed on a different commit than git blame would pick.
+
+Blamer hands out blame.Groups, just like parsing git blame output does.
+"""
+
+import binascii
+import collections
+import difflib
+import heapq
+
+import git
+
+from . import blame
+from . import util
+
+class Blamer(object):
+    """
+    Blames files of repo, a git.Repo, keeping up to max_blobs blobs and
+    max_diffs diffs around for the next time.
+    """
+
+    def __init__(self, repo, max_blobs=1024, max_diffs=4096):
+        self.repo = repo
+        self.max_blobs = max_blobs
+        self.max_diffs = max_diffs
+
+        self._commits = {}      # {commit hash: Commit}
+        self._paths = {}        # {(commit hash, path): blob hash or None}
+        self._blobs = collections.OrderedDict()    # {blob hash: [line]}
+        self._diffs = collections.OrderedDict()    # {(old, new): matching blocks}
+
+    def blame(self, rev, path, start=None, end=None):
+        """
+        Return a list of blame.Groups for the lines of path at the commit
+        hash rev, in order, as git blame would. start and end limit the lines
+        blamed, as in git blame -L. Raises KeyError if there is no such file
+        at rev.
+        """
+
+        blob = self._blob_hash(rev, path)
+        if blob is None:
+            raise KeyError("no such path in %s: %s" % (rev, path))
+        num_lines = len(self._lines(blob))
+        first = (start or 1) - 1
+        last = min(end or num_lines, num_lines)
+
+        # {commit hash: [(line in the commit's blob, line in the final blob)]}
+        rev = util.intern(rev)
+        pending = {rev: [(line, line) for line in range(first, last)]}
+        queue = [self._queue_key(rev)]
+        found = [None] * num_lines  # The commit hash of every final line.
+
+        while queue:
+            sha = heapq.heappop(queue)[2]
+            lines = pending.pop(sha)
+            blob = self._blob_hash(sha, path)
+
+            for parent in self._commit(sha).parents:
+                if not lines:
+                    break
+                parent_blob = self._blob_hash(parent, path)
+                if parent_blob is None:
+                    continue
+                if parent_blob == blob:
+                    passed, lines = lines, []
+                else:
+                    passed, lines = self._pass_lines(parent_blob, blob, lines)
+                if passed:
+                    if parent not in pending:
+                        pending[parent] = []
+                        heapq.heappush(queue, self._queue_key(parent))
+                    pending[parent].extend(passed)
+
+            for line, final in lines:
+                found[final] = sha
+
+        return self._groups(found, first, last, path)
+
+    def _pass_lines(self, old, new, lines):
+        """
+        Split lines, a list of (line in blob new, final line), into those
+        blob old has as well, with their line numbers in old, and the rest.
+        """
+
+        # Map every line of new that old has to its line in old.
+        to_old = {}
+        for a, b, size in self._matching_blocks(old, new):
+            for i in range(size):
+                to_old[b + i] = a + i
+
+        passed, kept = [], []
+        for line, final in lines:
+            if line in to_old:
+                passed.append((to_old[line], final))
+            else:
+                kept.append((line, final))
+        return passed, kept
+
+    def _groups(self, found, first, last, path):
+        """
+        Return the blame.Groups of the runs of final lines blamed on the same
+        commit.
+        """
+
+        groups = []
+        headers = {}    # {commit hash: headers}, shared as git blame does.
+        line = first
+        while line < last:
+            sha = found[line]
+            count = 1
+            while line + count < last and found[line + count] == sha:
+                count += 1
+
+            if sha not in headers:
+                commit = self._commit(sha)
+                headers[sha] = {'author': commit.name,
+                        'author-mail': '<%s>' % commit.email,
+                        'author-time': str(commit.time)}
+            group = blame.Group(sha, line + 1, line + 1, count, headers[sha])
+            group.filename = path
+            groups.append(group)
+            line += count
+        return groups
+
+    def _commit(self, sha):
+        commit = self._commits.get(sha)
+        if commit is None:
+            commit = self._commits[sha] = Commit(self.repo.commit(sha))
+        return commit
+
+    def _queue_key(self, sha):
+        # Newest first, like git blame.
+        commit = self._commit(sha)
+        return (-commit.committed, -commit.time, sha)
+
+    def _blob_hash(self, sha, path):
+        """
+        Return the hash of the blob at path in commit sha, or None.
+        """
+
+        key = (sha, path)
+        if key not in self._paths:
+            tree = git.Tree(self.repo, self._commit(sha).tree, path='')
+            try:
+                entry = tree / path
+            except KeyError:
+                entry = None
+            self._paths[key] = entry.hexsha if entry is not None and \
+                    entry.type == 'blob' else None
+        return self._paths[key]
+
+    def _lines(self, blob):
+        """
+        Return the lines of blob, without line endings.
+        """
+
+        lines = self._blobs.get(blob)
+        if lines is not None:
+            return lines
+
+        data = self.repo.odb.stream(binascii.unhexlify(blob)).read()
+        lines = data.split(b'\n')
+        if lines[-1] == b'':
+            # The file ends in a newline, which doesn't start a new line.
+            lines.pop()
+        self._blobs[blob] = lines
+        if len(self._blobs) > self.max_blobs:
+            self._blobs.popitem(last=False)
+        return lines
+
+    def _matching_blocks(self, old, new):
+        """
+        Return the (i, j, n) blocks of lines old[i:i+n] == new[j:j+n] difflib
+        finds between blobs old and new.
+        """
+
+        key = (old, new)
+        blocks = self._diffs.get(key)
+        if blocks is not None:
+            return blocks
+
+        matcher = difflib.SequenceMatcher(None, self._lines(old),
+                self._lines(new), autojunk=False)
+        blocks = self._diffs[key] = matcher.get_matching_blocks()
+        if len(self._diffs) > self.max_diffs:
+            self._diffs.popitem(last=False)
+        return blocks
+
+
+class Commit(object):
+    """
+    What Blamer needs of a commit, so that the git.Commit can go. tree is
+    the binary hash of its tree.
+    """
+
+    __slots__ = ('parents', 'tree', 'name', 'email', 'time', 'committed')
+
+    def __init__(self, commit):
+        self.parents = [util.intern(parent.hexsha) for parent in
+                commit.parents]
+        self.tree = commit.tree.binsha
+        self.name = commit.author.name
+        self.email = commit.author.email
+        self.time = commit.authored_date
+        self.committed = commit.committed_date
@@ -0,0 +1,151 @@
+"""
+Following files through renames and copies.
+
+git rev-list and git log -- path stop where path was renamed: before that,
+the file had another name. git log --follow gets past that, but only for a
+single file, and it has to detect renames in every commit again for every
+file asked about.
+
+Instead, the renames and copies of the whole repository are found once, in
+one walk:
+
+    git log -M -C --name-status --diff-filter=RC HEAD
+
+and kept per commit. The lineage of a file, the renames and copies that led
+to its path, comes out of those without running git again. The history of the
+file is then the history of all the paths in its lineage, each up to the
+commit that moved the file on to the next one. As with git diff -C, copies are
+only found from files that the same commit changed.
+"""
+
+from . import util
+
+# Every commit in the stream starts with a line holding a NUL and its hash.
+HEADER = '%x00%H'
+
+# Keyword arguments for repo.git.log that produce the stream parse_log reads.
+LOG_KWARGS = {
+        'format': HEADER,
+        'name_status': True,
+        'find_renames': True,
+        'find_copies': True,
+        'diff_filter': 'RC',
+        'no_color': True,
+        }
+
+# Keyword arguments for repo.git.log to read the history of a file under all
+# the paths of its lineage, with the renames and copies between them seen as
+# such, so that a rename isn't counted as adding the whole file again.
+FOLLOW_KWARGS = {
+        'no_renames': False,
+        'find_renames': True,
+        'find_copies': True,
+        }
+
+
+class Renames(object):
+    """
+    head is the commit hash the renames are known up to. moves is a list of
+    (commit hash, old path, new path), newest commit first, of every rename
+    and copy up to head.
+    """
+
+    def __init__(self):
+        self.head = None
+        self.moves = []
+
+    def add(self, moves):
+        """
+        Add moves, a list like self.moves of commits newer than those already
+        known.
+        """
+        self.moves = list(moves) + self.moves
+
+    def lineage(self, path):
+        """
+        Return the moves that led to path, newest first.
+        """
+
+        lineage = []
+        for sha, old, new in self.moves:
+            if new == path:
+                lineage.append((sha, old, new))
+                path = old
+        return lineage
+
+
+def paths(path, lineage):
+    """
+    Return all the paths the file now at path had, given its lineage.
+    """
+    return [path] + [old for sha, old, new in lineage]
+
+
+def names(shas, path, lineage):
+    """
+    Given the commit hashes of the history of the file now at path, oldest
+    first, yield (sha, the path of the file at that commit).
+    """
+    namer = _Namer(path, lineage)
+    for sha in shas:
+        yield sha, namer.name(sha)
+
+
+def follow(commits, path, lineage, newest_first=False):
+    """
+    Given the history.Commits of all paths of the lineage of path, oldest
+    first unless newest_first, yield them with only the lines added to the
+    file itself in added, under whatever path it had at the time.
+    """
+
+    namer = _Namer(path, lineage, newest_first)
+    for commit in commits:
+        name = namer.name(commit.sha)
+        commit.added = dict((p, n) for p, n in commit.added.items()
+                if p == name)
+        yield commit
+
+
+class _Namer(object):
+    """
+    Tells the path of a file at each commit of its history, asked oldest
+    first, or newest first if newest_first.
+    """
+
+    def __init__(self, path, lineage, newest_first=False):
+        self._newest_first = newest_first
+        if newest_first:
+            self._moves = list(lineage)
+            self._name = path
+        else:
+            self._moves = list(reversed(lineage))   # Oldest first.
+            self._name = self._moves[0][1] if self._moves else path
+
+    def name(self, sha):
+        name = self._name
+        if self._moves and sha == self._moves[0][0]:
+            # The commit that moved the file has it under the new path.
+            sha, old, new = self._moves.pop(0)
+            if self._newest_first:
+                self._name = old
+            else:
+                name = self._name = new
+        return name
+
+
+def parse_log(lines):
+    """
+    Given an iterable of lines of git-log output produced with LOG_KWARGS,
+    return a list like Renames.moves.
+    """
+
+    moves = []
+    sha = None
+    for line in lines:
+        if line.startswith('\x00'):
+            sha = line[1:]
+        elif line and sha is not None:
+            # <status> TAB <old path> TAB <new path>, e.g. R093 or C100.
+            status, old, new = line.split('\t')
+            moves.append((sha, util.unquote_path(old), util.unquote_path(new)))
+    return moves
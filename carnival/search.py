@@ -1,10 +1,30 @@
 import git
-import util
+import heapq
 import math
+import multiprocessing
+import operator
 import time
 import csv
 import hashlib
 
+from git.compat import safe_decode
+
+from . import util
+from . import authors
+from . import blame
+from . import cache
+from . import catfile
+from . import churn
+from . import history
+from . import index
+from . import odb
+from . import renames
+from . import snippets
+from . import stats
+from . import timeline
+from . import tree
+from .authors import Person
+
 def to_csv(scores, filename='out.csv', show_email=True, show_name=False,
         **kwargs):
     """
@@ -13,26 +33,44 @@ def to_csv(scores, filename='out.csv', show_email=True, show_name=False,
     Optional arguments:
         algorithm, salt
     """
-    person_num = 0
-    writer = csv.writer(open(filename, 'wb'))
-    for person, score in scores.items():
-        row = []
-        if show_email:
-            email = util.anonymize(person.email, **kwargs)
-            row.append(email)
-        if show_name:
-            name = util.anonymize(person.name, **kwargs)
-            row.append(name)
-        row.append(score)
-        writer.writerow(row)
-    
-def niceprint(scores):
-    items = []
-    for person, score in scores.items():
-        items.append({'person':person, 'score':score})
-    items.sort(cmp=lambda x,y: cmp(y['score'], x['score']))
-    for item in items:
-        print "%s: %0.5f" % (item['person'].email, item['score'])
+    with util.open_csv(filename) as f:
+        writer = csv.writer(f)
+        for person, score in scores.items():
+            row = []
+            if show_email:
+                email = util.anonymize(person.email, **kwargs)
+                row.append(email)
+            if show_name:
+                name = util.anonymize(person.name, **kwargs)
+                row.append(name)
+            row.append(score)
+            writer.writerow(row)
+
+def niceprint(scores, k=None):
+    """
+    Print the people in scores, a dict {Person: score}, best first. If k is
+    given, only the k best are printed.
+    """
+    if k is None:
+        k = len(scores)
+    for person, score in top(scores, k):
+        print("%s: %0.5f" % (person.email, score))
+
+def top(scores, k, normalize=False):
+    """
+    Return a list of the (Person, score) pairs of the k people with the
+    highest scores in scores, a dict {Person: score}, best first. If normalize
+    is True, the scores returned are divided by the total of all scores.
+
+    This doesn't sort everyone, so it stays fast when k is small and there
+    are many people.
+    """
+    best = heapq.nlargest(k, scores.items(), key=operator.itemgetter(1))
+    if normalize:
+        total = sum(scores.values())
+        if total:
+            best = [(person, score / total) for person, score in best]
+    return best
 
 class Search(object):
     """
@@ -62,11 +100,299 @@ class Search(object):
         In other words, we don't count removal of lines as contributions!
     """
 
-    def __init__(self, repo_path):
+    def __init__(self, repo_path, mailmap=False, cache_dir=None,
+            cache_size=64 * 1024 * 1024, index_path=None, stats=None,
+            blame_backend='git', follow_renames=False):
+        """
+        If mailmap is True, authors are mapped to their proper identities using
+        the repository's .mailmap, on top of what git already does.
+
+        If cache_dir is given, blame and history results are kept in a
+        persistent cache in that directory, limited to about cache_size bytes.
+        The cache may be shared between repositories and processes.
+
+        If index_path is given, the expertise index saved there (see
+        build_index) is used to answer queries about the commit it is up to
+        date with.
+
+        If stats is given, a stats.Stats, the git commands this Search runs
+        and the time spent in each stage of scoring are recorded in it. The
+        worker processes of score_many aren't recorded.
+
+        blame_backend is how files are blamed: 'git' runs git blame, and 'odb'
+        blames in process, reading the object database directly and keeping
+        the blobs and diffs it reads for later blames (see the odb module).
+        Its blames are cached apart from those of git blame, since they can
+        credit lines to other commits, and aren't kept in the index.
+
+        If follow_renames is True, the history of a file goes on past the
+        commits that renamed or copied it, under its earlier paths. The
+        renames and copies of the whole repository are found once, the first
+        time they are needed (see the renames module). This doesn't apply to
+        ranges of lines, directories and glob patterns. git blame is then run
+        with -C, to find lines copied from other files as well, so this can't
+        be used with the 'odb' blame backend. score_churn can't follow renames
+        either.
+        """
+
         self.repo_path = repo_path
         self.repo = git.Repo(repo_path, odbt=git.GitDB)
 
-        self.authors = []
+        # What it takes to make an equivalent Search in a worker process.
+        self._options = {'mailmap': mailmap, 'cache_dir': cache_dir,
+                'cache_size': cache_size, 'index_path': index_path,
+                'blame_backend': blame_backend,
+                'follow_renames': follow_renames}
+
+        self.stats = stats
+
+        # Long-lived git processes for reading objects.
+        self.catfile = catfile.Pool(self.repo, stats=stats)
+
+        if blame_backend not in ('git', 'odb'):
+            raise ValueError("unknown blame backend: %s" % blame_backend)
+        if blame_backend == 'odb' and follow_renames:
+            raise ValueError("the odb blame backend can't follow renames")
+        self.blamer = None
+        if blame_backend == 'odb':
+            self.blamer = odb.Blamer(self.repo)
+
+        self.authors = authors.Registry(self._mailmap() if mailmap else None)
+        # The Person of each of self.index.people, as far as found; see
+        # _index_people.
+        self._index_authors = []
+        self._index_authors_of = None
+        self.datetimes = {}     # {commit hash: unix time}
+
+        self.cache = None
+        if cache_dir is not None:
+            self.cache = cache.Cache(cache_dir, max_size=cache_size)
+
+        self.index_path = index_path
+        self.index = None
+        if index_path is not None:
+            self.index = index.Index.load(index_path)
+
+        # Built on the first find_snippet.
+        self.snippets = None
+
+        # The contributions of the files and directories of the last tree
+        # asked about; see _tree_contributions.
+        self.tree = tree.Tree()
+
+        # Built on the first score_churn, and again when asked about another
+        # commit.
+        self.churn = None
+
+        self.follow_renames = follow_renames
+        # The renames and copies of the repository, found when first needed.
+        self.renames = None
+
+    def close(self):
+        """
+        Stop the git processes this Search keeps around, and close the cache.
+        """
+        self.catfile.close()
+        if self.cache is not None:
+            self.cache.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def build_index(self, rev='HEAD', blame=True):
+        """
+        Build the expertise index of the whole repository at rev from scratch,
+        and save it to self.index_path, if set.
+
+        This reads the history of every path in one pass. If blame is True,
+        every file at rev is blamed as well; otherwise files are blamed when
+        they are first asked about. When following renames or blaming with
+        the odb backend, files are never blamed into the index, since it only
+        holds the blames of plain git blame.
+        """
+
+        head = self._rev_parse(rev)
+        self.index = index.Index()
+        self.index.head = head
+
+        log = self._git_lines('log', head, **history.LOG_KWARGS)
+        for commit in history.parse_log(log):
+            self.index.add_commit(commit)
+
+        if blame and self._blame_kind() == 'blame':
+            for path in self._ls_files(head):
+                self._lines_contributed(path, head)
+
+        if self.index_path is not None:
+            self.index.save(self.index_path)
+
+    def refresh_index(self, rev='HEAD', blame=True):
+        """
+        Bring the expertise index up to date with rev, building it if there
+        is none, and save it to self.index_path, if set.
+
+        If the index was built at an ancestor of rev, only the commits in
+        between are read, and only the files they changed are blamed again
+        (right away if blame is True, otherwise when first asked about).
+        Otherwise, e.g. after a force push, the index is built from scratch.
+        """
+
+        new = self._rev_parse(rev)
+        if self.index is None or not self._is_ancestor(self.index.head, new):
+            self.build_index(new, blame=blame)
+            return
+        old = self.index.head
+        if old == new:
+            return
+
+        log = self._git_lines('log', '%s..%s' % (old, new), **history.LOG_KWARGS)
+        for commit in history.parse_log(log):
+            self.index.add_commit(commit)
+
+        # Pairs of status letter and path, all separated by NULs.
+        changed = self._git('diff', old, new, name_status=True,
+                no_renames=True, z=True).split('\0')
+        statuses, paths = changed[0::2], changed[1::2]
+        self.index.forget_blame(paths)
+        self.index.head = new
+
+        if blame and self._blame_kind() == 'blame':
+            for status, path in zip(statuses, paths):
+                if status != 'D':
+                    self._lines_contributed(path, new)
+
+        if self.index_path is not None:
+            self.index.save(self.index_path)
+
+    def find_snippet(self, snippet, rev='HEAD', limit=5):
+        """
+        Return up to limit (Block, score) pairs for the places in the tree of
+        rev that snippet most likely comes from, best first. score is in
+        [0, 1], 1 meaning all of the snippet was found there. The blocks are
+        at the commit rev names, so they can be scored as they are.
+
+        The first call indexes every file of the tree, which takes a while.
+        Later calls only index the files that changed since.
+        """
+
+        sha = self._rev_parse(rev)
+        if self.snippets is None:
+            self.snippets = snippets.SnippetIndex()
+        if self.snippets.rev != sha:
+            self.snippets.update(sha, self._ls_blobs(sha),
+                    lambda blob: self.catfile.read(blob)[2])
+
+        return [(Block(path, start, end, rev=sha), score) for
+                path, start, end, score in self.snippets.find(snippet, limit)]
+
+    def score_snippet(self, snippet, method='all_commits', rev='HEAD'):
+        """
+        Score the place snippet most likely comes from (see find_snippet)
+        with the given method, as in score_many. Returns a pair of the Block
+        that was scored and the scores, or (None, {}) if the snippet wasn't
+        found.
+        """
+
+        found = self.find_snippet(snippet, rev=rev, limit=1)
+        if not found:
+            return None, {}
+        block, match = found[0]
+        return block, getattr(self, 'score_' + method)(block)
+
+    # For each scoring method, the name of the method that finds the
+    # contributions, and the aging to apply to them.
+    METHODS = {
+            'last_commit': ('_lines_contributed', None),
+            'all_commits': ('_lines_contributed_history', None),
+            'all_commits_over_time': ('_lines_contributed_history', 'exp'),
+            }
+
+    def score_many(self, blocks, method='all_commits', workers=None,
+            timenow=None):
+        """
+        Returns a dict {block: {Person: score}} for every block in blocks,
+        using the given method, which is the name of one of the score_*
+        methods without the score_ prefix, e.g. 'last_commit'.
+
+        The git work is spread over a pool of worker processes, one per CPU by
+        default. Each worker has its own Search, and the authors it finds are
+        merged back into self.authors, so the Person objects in the result
+        are the same as those the score_* methods return.
+        """
+
+        return dict(self.score_each(blocks, method=method, workers=workers,
+            timenow=timenow))
+
+    def score_each(self, blocks, method='all_commits', workers=None,
+            timenow=None, errors=False):
+        """
+        Like score_many, but yield (block, {Person: score}) for every block
+        in blocks, in order, as soon as it is scored.
+
+        If errors is True, a block that can't be scored, because git fails on
+        it, there is no such directory or it can't be scored that way, yields
+        (block, the exception) instead, and the other blocks are still scored.
+        """
+
+        contributions_method, aging = self.METHODS[method]
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+        if workers > 1:
+            # Without workers, blocks are only read as they are scored.
+            blocks = list(blocks)
+            workers = min(workers, len(blocks))
+
+        if workers <= 1:
+            results = (_score_block(self, block, contributions_method, errors)
+                    for block in blocks)
+            pool = None
+        else:
+            pool = multiprocessing.Pool(workers, _init_worker,
+                    (self.repo_path, self._options))
+            results = pool.imap(_score_worker,
+                    [(block, contributions_method, errors) for block in blocks])
+
+        try:
+            for block, rows, datetimes, error in results:
+                if error is not None:
+                    yield block, error
+                    continue
+                self.datetimes.update(datetimes)
+                contributions, num_lines_total = self._contributions_from_rows(rows)
+                yield block, self._score_author_contributions(contributions,
+                        timenow=timenow, aging=aging)
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+
+    def top_experts(self, block, k=5, method='all_commits', timenow=None):
+        """
+        Returns a list of the (Person, score) pairs of the k people with the
+        highest scores for block, best first, using the given method as in
+        score_many. The scores are the same as those of the score_* method.
+
+        Only the k best scores are normalized, and the people are picked with
+        a heap instead of sorting everyone. If the index is up to date with
+        the block, the lines of each person are summed straight from it,
+        without making contributions first.
+        """
+
+        contributions_method, aging = self.METHODS[method]
+        if contributions_method == '_lines_contributed':
+            kind = self._blame_kind()
+        else:
+            kind = 'history'
+        scores = self._index_scores(kind, Block.of(block), timenow=timenow,
+                aging=aging)
+        if scores is None:
+            contributions, num_lines_total = getattr(self, contributions_method)(block)
+            scores = self._score_author_contributions(contributions,
+                    timenow=timenow, aging=aging, normalize=False)
+        return top(scores, k, normalize=True)
 
     def score_all_commits_over_time(self, block, timenow=None):
         """
@@ -75,9 +401,7 @@ class Search(object):
         consideration to the temporal dimension.
         """
 
-        revs = self._rev_list(block)
-        datetimes = self._datetimes(revs)
-        contributions, num_lines_total = self._lines_contributed_for_revs(block, revs)
+        contributions, num_lines_total = self._lines_contributed_history(block)
         return self._score_author_contributions(contributions, timenow=timenow, aging='exp')
 
     def score_all_commits(self, block):
@@ -96,10 +420,186 @@ class Search(object):
         TODO: what about lines of code the author has removed?
         """
 
-        revs = self._rev_list(block)
-        contributions, num_lines_total = self._lines_contributed_for_revs(block, revs)
+        contributions, num_lines_total = self._lines_contributed_history(block)
         return self._score_author_contributions(contributions)
 
+    def score_timeline(self, block, timepoints=None, aging='exp', lmb=0.005,
+            min_val=0.1):
+        """
+        Returns a list of (timepoint, {Person: score}), in order of time, of
+        the scores of the block at every point in (unix) time in timepoints,
+        or at the time of every commit of the block if not given.
+
+        The scores at time t are those of score_all_commits_over_time with
+        timenow=t, over the commits made up to t. With aging=None, they are
+        those of score_all_commits instead.
+
+        The history of the block is read once, however many points in time
+        there are. See the timeline module.
+        """
+
+        contributions, num_lines_total = self._lines_contributed_history(block)
+        datetimes = self._datetimes(contributions.keys())
+
+        rows = []
+        for sha, contribution in contributions.items():
+            rows.append((datetimes[sha], contribution.person,
+                contribution.num_lines))
+        if timepoints is None:
+            timepoints = sorted(set(then for then, person, num_lines in rows))
+
+        return timeline.snapshots(rows, timepoints, lmb=lmb, min_val=min_val,
+                aging=aging)
+
+    def score_approx(self, block, max_revs=None, max_seconds=None,
+            aging=None, timenow=None):
+        """
+        Returns (scores, error), where scores are those of score_all_commits,
+        or of score_all_commits_over_time with aging='exp', but from only the
+        most recent commits of the block: at most max_revs of them, and only
+        as many as can be read in about max_seconds.
+
+        error estimates how far off any score may be: the share of the total
+        score the commits left out would have had, if they added as many
+        lines on average as the commits read. With aging, older commits weigh
+        less, so the estimate uses the weight of the oldest commit read. It
+        is 0 if no commit was left out.
+
+        Lines added by merges to a range of lines aren't counted.
+
+        When following renames, the renames of the whole repository are
+        found the first time they are needed. That counts towards
+        max_seconds, but can't be cut short, so call find_renames beforehand
+        to keep it out of the first query.
+        """
+
+        deadline = None
+        if max_seconds is not None:
+            deadline = stats.timer() + max_seconds
+
+        block = Block.of(block)
+        rev = block.rev or 'HEAD'
+        lineage = self._lineage(block, rev)
+        args, kwargs = self._log_args(block, rev, lineage)
+        # Newest first, so that git can start right away, and we can stop.
+        kwargs = dict(kwargs, reverse=False)
+        if max_revs is not None:
+            kwargs['max_count'] = max_revs
+
+        commits = []
+        truncated = False
+        log = self._git_lines('log', *args, **kwargs)
+        try:
+            found = history.parse_log(log)
+            if lineage:
+                found = renames.follow(found, block.filename, lineage,
+                        newest_first=True)
+            for commit in found:
+                commits.append(commit)
+                if deadline is not None and stats.timer() > deadline:
+                    truncated = True
+                    break
+        finally:
+            log.close()
+        if max_revs is not None and len(commits) >= max_revs:
+            truncated = True
+
+        contributions, num_lines_total, merges = self._history_contributions(
+                block, commits)
+        scores = self._score_author_contributions(contributions,
+                timenow=timenow, aging=aging, normalize=False)
+        seen = sum(scores.values())
+
+        error = 0.0
+        if truncated:
+            # Counting commits is cheap next to diffing them. For a range,
+            # this counts every commit of the file, and for a file with a
+            # lineage, every commit of all its paths, so errs on the safe side.
+            num_revs = int(self._git('rev_list', rev, '--',
+                *renames.paths(block.filename, lineage or []), count=True))
+            unseen = max(0, num_revs - len(commits)) * num_lines_total / \
+                    float(max(1, len(commits)))
+            if aging == 'exp' and commits:
+                unseen *= self._aging_exp(self._days_since(commits[-1].sha,
+                    timenow))
+            if seen + unseen:
+                error = unseen / (seen + unseen)
+            elif num_revs:
+                error = 1.0
+
+        if seen:
+            for person, score in scores.items():
+                scores[person] = score / seen
+        return scores, error
+
+    def score_churn(self, block, timenow=None, aging=None, removed_weight=1.0,
+            rev=None):
+        """
+        Returns a dict of author to the contribution [0, 1] of the author for
+        this particular block, counting the lines the author added to and
+        removed from it in every commit. Removed lines count removed_weight
+        times as much as added ones. With aging='exp', commits are aged as in
+        score_all_commits_over_time.
+
+        This is rougher than the other scores, since lines are counted no
+        matter whether they are still around or how often they were
+        rewritten. But the churn of every path of the repository is read in
+        one git log walk, the first time it is needed, so scoring any number
+        of files, directories or glob patterns takes about as long as that
+        one walk. 'glob:*' scores the whole repository. Blocks can't be
+        ranges of lines, nor files when following renames.
+        """
+
+        block = Block.of(block)
+        if block.is_range():
+            raise ValueError("churn can't score a range of lines: %s" % block)
+        if self.follow_renames and not block.is_tree():
+            raise ValueError("churn can't follow renames: %s" % block)
+
+        changes = self._churn(rev or block.rev or 'HEAD')
+        now = timenow if timenow else time.time()
+        scores = {}
+        total_score = 0
+        for path in changes.paths(block.filename, block.is_glob()):
+            for person, then, added, removed in changes.changes[path]:
+                score = added + removed_weight * removed
+                if aging == 'exp':
+                    score *= self._aging_exp(float(now - then) / 60 / 60 / 24)
+                total_score += score
+                scores[person] = scores.get(person, 0) + score
+
+        if total_score:
+            for person, score in scores.items():
+                scores[person] = score / total_score
+        return scores
+
+    def score_grid(self, block, lmbs=(0.005,), timenows=None, min_val=0.1,
+            method='all_commits'):
+        """
+        Returns a dict {(lmb, timenow): {Person: score}} of the time-aged
+        scores of the block, as in score_all_commits_over_time, for every
+        decay rate lmb in lmbs and every point in time in timenows (just now,
+        if not given). A decay rate of None means no aging.
+
+        method names the contributions to use, as in score_many.
+
+        The git work is done once, and the scores are computed for the whole
+        grid at once with NumPy (see the matrix module), which must be
+        installed.
+        """
+
+        contributions_method, aging = self.METHODS[method]
+        contributions, num_lines_total = getattr(self, contributions_method)(block)
+        datetimes = self._datetimes(contributions.keys())
+        if timenows is None:
+            timenows = [time.time()]
+
+        # Only now, since this imports NumPy.
+        from . import matrix
+        contribution_matrix = matrix.ContributionMatrix.from_contributions(
+                contributions, datetimes)
+        return contribution_matrix.score_dicts(lmbs, timenows, min_val)
+
     def score_last_commit(self, block):
         """
         Implementation of Score_{LastCommit}(author, block).
@@ -111,28 +611,36 @@ class Search(object):
         contributions, num_lines_total = self._lines_contributed(block)
         return self._score_author_contributions(contributions)
 
+    @stats.timed
     def _score_author_contributions(self, contributions, timenow=None, aging=None,
             normalize=True):
         """
-        Takes a dict {commit hash: {...}} and inverses it to a dict
+        Takes a dict {commit hash: Contribution} and inverses it to a dict
         {Person: score}. 
         
         A person may show up multiple times in contributions, but this function
         will squish all of that into one person.
 
-        Warning: A person is identified by the person's name and email. Thus,
+        A person is identified by the person's name, then by the person's email
+        (see authors.Registry.find). Thus,
 
             Bob & Rachel <bob@example.com>
             Bob <bob@example.com>
 
-        are two different people.
+        are the same person, unless Bob has already been seen with another
+        email. Use mailmap=True to merge aliases listed in .mailmap.
         """
 
+        if aging == 'exp':
+            # Load the dates of all commits at once, instead of asking git for
+            # them one by one in _days_since.
+            self._datetimes(contributions.keys())
+
         scores = {}
         total_score = 0
-        for sha, data in contributions.items():
-            person = data['person']
-            num_lines = data['num_lines']
+        for sha, contribution in contributions.items():
+            person = contribution.person
+            num_lines = contribution.num_lines
 
             score = float(num_lines)
             if aging == 'exp':
@@ -150,140 +658,720 @@ class Search(object):
 
         return scores
 
-    def _rev_list(self, block, rev='HEAD'):
+    @stats.timed
+    def _rev_list(self, block, rev=None):
         """
         Return list of commit hashes. Ordered from earliest to latest.
         """
 
+        block = Block.of(block)
+        rev = rev or block.rev or 'HEAD'
+
         # We make the assumption that we don't want to use thrown-away code.
         # Thus, we don't use the --all flag for git-rev-list. This is because
         # the --all flag will grab all references to the block, including
         # "dangling" references such as commit blobs that were thrown away.
 
-        revs = self.repo.git.rev_list(rev, block).split()
+        lineage = self._lineage(block, rev)
+        if block.is_range():
+            # Only git-log can follow a range of lines through history.
+            revs = self._git('log', rev, s=True, format='%H',
+                    L=self._log_range(block)).split()
+        elif lineage:
+            return [sha for sha, name in self._rev_names(block, rev, lineage)]
+        else:
+            revs = self._git('rev_list', rev, '--', block.filename).split()
         revs.reverse()  # earliest commits first
         return revs
 
+    def _rev_names(self, block, rev, lineage):
+        """
+        Return the (commit hash, path of the file then) of every commit of
+        the history of block up to rev, following its lineage (see
+        renames.Renames.lineage), earliest first.
+        """
+
+        out = self._git('log', rev, '--', *renames.paths(block.filename,
+            lineage), format='%x00%H', name_only=True, reverse=True,
+            **renames.FOLLOW_KWARGS)
+        touched = []    # [(commit hash, set of paths)]
+        for line in out.splitlines():
+            if line.startswith('\x00'):
+                touched.append((line[1:], set()))
+            elif line:
+                touched[-1][1].add(util.unquote_path(line))
+
+        # Commits to the earlier paths after the file moved on aren't ours.
+        return [(sha, name) for (sha, name), (sha, paths) in zip(renames.names(
+            [sha for sha, paths in touched], block.filename, lineage), touched)
+            if name in paths]
+
+    @stats.timed
     def _find_author(self, name=None, email=None, add_author=False):
         """
         Find author with given name and/or email. If author does not exist,
         add the author if add_author is True.
         """
+        return self.authors.find(name=name, email=email, add=add_author)
 
-        for author in self.authors:
-            if name and email and author.name == name and author.email == email:
-                return author
-            elif name and author.name == name:
-                return author
-            elif author.name == email:
-                return author
-        if add_author:
-            person = Person(name, email)
-            self.authors.append(person)
-            return person
-        return None
+    def _mailmap(self):
+        """
+        Return the authors.Mailmap of the .mailmap file at HEAD, which is empty
+        if there is no such file.
+        """
+        try:
+            sha, type, text = self.catfile.read('HEAD:.mailmap')
+        except KeyError:
+            text = b''
+        return authors.Mailmap(safe_decode(text))
 
+    @stats.timed
     def _lines_contributed_for_revs(self, block, revs):
         """
         Given a block, return a dict of commit hashes to the author and author's
         contribution for each revision in revs:
 
-            contributions = {rev_1: {'num_lines': num_lines,
-                                     'person': Person,},
+            contributions = {rev_1: Contribution(person, num_lines),
                              rev_2: ...}
-                                     
 
         Each commit hash has exactly one author. This is different from
         _lines_contributed, which may contain more than one authors.
         """
+        block = Block.of(block)
+        paths = {}
+        lineage = self._lineage(block, block.rev or 'HEAD')
+        if lineage:
+            paths = dict(renames.names(revs, block.filename, lineage))
+
         contributions = {}
         num_lines_total = 0
         for rev in revs:
-            rev_contributions, num_lines_rev = self._lines_contributed(block, rev)
-            for sha, data in rev_contributions.items():
+            rev_block = block
+            if paths.get(rev, block.filename) != block.filename:
+                # The file had another path at rev.
+                rev_block = Block(paths[rev])
+            try:
+                self.catfile.read('%s:%s' % (rev, rev_block.filename))
+            except KeyError:
+                # rev deleted the file, so it added no lines to it.
+                continue
+            rev_contributions, num_lines_rev = self._lines_contributed(rev_block,
+                    rev)
+            for sha, contribution in rev_contributions.items():
                 if sha != rev:
                     # This sha irrelevant for this iteration. For example, it is
                     # from an older (thus, already counted) contribution.
                     continue
 
-                person = data['person']
-                num_lines = data['num_lines']
+                num_lines = contribution.num_lines
                 if rev in contributions:
                     # We could see the same rev multiple times because they are
                     # split up by line blocks by the git-blame output.
-                    contributions[rev]['num_lines'] += num_lines
+                    contributions[rev].num_lines += num_lines
                 else:
-                    contributions[rev] = {'person': person,
-                            'num_lines': num_lines}
+                    contributions[rev] = Contribution(contribution.person,
+                            num_lines)
                 num_lines_total += num_lines
         return contributions, num_lines_total
 
+    @stats.timed
+    def _lines_contributed_history(self, block, rev=None):
+        """
+        Given a block, return the same contributions as
+
+            self._lines_contributed_for_revs(block, self._rev_list(block, rev))
+
+        but from a single pass over the block's history, instead of one
+        git-blame per revision. See the history module for how this works.
 
-    def _lines_contributed(self, block, rev="HEAD"):
+        For a range of lines, git log -L follows the range back through
+        history, so that the cost depends on the size of the range, not the
+        size of the file.
+        """
+
+        block = Block.of(block)
+        rev = rev or block.rev or 'HEAD'
+        if block.is_tree():
+            return self._tree_contributions('history', block, rev)
+        lineage = self._lineage(block, rev)
+        kind = 'history_renames' if lineage else 'history'
+        rev, found = self._known_contributions(kind, rev, block)
+        if found is not None:
+            return found
+
+        args, kwargs = self._log_args(block, rev, lineage)
+        commits = history.parse_log(self._git_lines('log', *args, **kwargs))
+        if lineage:
+            commits = renames.follow(commits, block.filename, lineage)
+        contributions, num_lines_total, merges = self._history_contributions(
+                block, commits)
+
+        if merges:
+            # Lines added by merges to the range can't be seen in the log, so
+            # fall back to those still in the range at rev.
+            blamed, blamed_total = self._lines_contributed(block, rev)
+            num_lines_total += self._merge_contributions(contributions, merges,
+                    blamed)
+
+        self._remember_contributions(kind, rev, block, contributions)
+        return contributions, num_lines_total
+
+    @stats.timed
+    def _lines_contributed(self, block, rev=None):
         """
         Given a block, return a dict of commit hashes to the author and author's
         contribution:
 
-            contributions = {sha_1: {'person': Person,
-                                     'num_lines': num_lines}
-                             sha_2: ...
+            contributions = {sha_1: Contribution(person, num_lines),
+                             sha_2: ...}
 
         This method only looks at the blame outputs produced by commit hash 'rev'.
         Past contributions that is overriden by later contributions is not seen.
         To see this data, use _lines_contributed_for_revs().
         """
 
-        contributions = {}      # {commit hash: [Person, num lines]}
-        shas = set()
+        block = Block.of(block)
+        if block.is_tree():
+            return self._tree_contributions('blame', block,
+                    rev or block.rev or 'HEAD')
+        kind = self._blame_kind()
+        rev, found = self._known_contributions(kind, rev or block.rev or 'HEAD',
+                block)
+        if found is not None:
+            return found
+
+        if self.blamer is not None:
+            groups = self.blamer.blame(self._rev_parse(rev), block.filename,
+                    block.start, block.end)
+        else:
+            args, kwargs = self._blame_args(block, rev)
+            groups = blame.parse_incremental(self._git_lines('blame', *args,
+                    **kwargs))
+        contributions, num_lines_total = self._blame_contributions(groups)
+
+        self._remember_contributions(kind, rev, block, contributions)
+        return contributions, num_lines_total
+
+    def _log_args(self, block, rev, lineage=None):
+        """
+        Return the (args, kwargs) of the git log of block's history up to rev,
+        under all the paths of its lineage, if given.
+        """
+        if block.is_range():
+            return (rev,), dict(history.LOG_KWARGS, L=self._log_range(block))
+        if lineage:
+            return ((rev, '--') + tuple(renames.paths(block.filename, lineage)),
+                    dict(history.LOG_KWARGS, **renames.FOLLOW_KWARGS))
+        return (rev, '--', block.filename), history.LOG_KWARGS
+
+    def find_renames(self, rev='HEAD'):
+        """
+        Find the renames and copies of the repository up to rev now, if
+        following renames, instead of the first time they are needed. Later
+        calls only read the commits since.
+        """
+        if self.follow_renames:
+            self._update_renames(self._rev_parse(rev))
+
+    def _lineage(self, block, rev):
+        """
+        Return the renames and copies that led to block at rev, newest first,
+        as in renames.Renames.lineage, if following renames, or None.
+        """
+
+        if not self.follow_renames or block.is_range() or block.is_tree():
+            return None
+        self._update_renames(self._rev_parse(rev))
+        return self.renames.lineage(block.filename)
+
+    def _update_renames(self, rev):
+        """
+        Bring self.renames up to date with commit hash rev, reading only the
+        commits since the last time, if rev descends from it.
+        """
+
+        if self.renames is not None and self.renames.head == rev:
+            return
+
+        if self.renames is not None and self._is_ancestor(self.renames.head,
+                rev):
+            since = '%s..%s' % (self.renames.head, rev)
+            self.renames.add(renames.parse_log(self._git_lines('log', since,
+                **renames.LOG_KWARGS)))
+        else:
+            self.renames = renames.Renames()
+            moves = None
+            if self.cache is not None:
+                moves = self.cache.get('renames', rev)
+            if moves is not None:
+                self.renames.add(tuple(move) for move in moves)
+                self.renames.head = rev
+                return
+            self.renames.add(renames.parse_log(self._git_lines('log', rev,
+                **renames.LOG_KWARGS)))
+        self.renames.head = rev
+
+        if self.cache is not None:
+            self.cache.put('renames', rev, self.renames.moves)
+
+    def _blame_args(self, block, rev):
+        """
+        Return the (args, kwargs) of the git blame of block at rev.
+        """
+        kwargs = {'incremental': True}
+        if block.is_range():
+            kwargs['L'] = block.line_range()
+        if self.follow_renames:
+            # git blame follows renames anyway. This has it find lines copied
+            # from files the same commit changed too, as the history does.
+            kwargs['C'] = True
+        return (rev, '--', block.filename), kwargs
+
+    def _blame_kind(self):
+        """
+        Return the kind blames are kept under in the cache: 'blame' for git
+        blame, 'blame_copies' when it was run with -C to follow renames, which
+        credits copied lines differently, or 'blame_odb' for the odb backend,
+        which can credit lines to other commits than git blame does. The index
+        only holds the first.
+        """
+        if self.blamer is not None:
+            return 'blame_odb'
+        return 'blame_copies' if self.follow_renames else 'blame'
 
-        blamestr = self.repo.git.blame(rev, block, incremental=True)
-        lines = blamestr.splitlines()
+    def _history_contributions(self, block, commits):
+        """
+        Given the history.Commits of block's history, return
+        (contributions, num_lines_total, merges), where merges are the commit
+        hashes of merges whose contributions to block can't be seen in the log
+        and have to be found by blame instead.
+        """
+
+        contributions = {}
+        num_lines_total = 0
+        merges = []
+
+        for commit in commits:
+            # We get the commit dates for free, so save them for aging.
+            self.datetimes[commit.sha] = commit.time
+
+            num_lines = commit.num_lines()
+            if not num_lines:
+                if block.is_range() and not commit.added:
+                    # git log -L has a diff for every commit it shows, except
+                    # for merges.
+                    merges.append(commit.sha)
+                # Like git-blame, we don't count removals as contributions.
+                continue
+
+            person = self._find_author(name=commit.name, email=commit.email,
+                    add_author=True)
+            contributions[commit.sha] = Contribution(person, num_lines)
+            num_lines_total += num_lines
+
+        return contributions, num_lines_total, merges
+
+    def _merge_contributions(self, contributions, merges, blamed):
+        """
+        Add the contributions of the merges found in blamed, the blame
+        contributions of the same block, to contributions. Return the number
+        of lines added.
+        """
+        num_lines = 0
+        for sha in merges:
+            if sha in blamed:
+                contributions[sha] = blamed[sha]
+                num_lines += blamed[sha].num_lines
+        return num_lines
+
+    def _blame_contributions(self, groups):
+        """
+        Given the blame.Groups of a blame, return (contributions,
+        num_lines_total).
+        """
 
+        contributions = {}      # {commit hash: Contribution}
         num_lines_total = 0
 
-        sha = None
-        i = 0
-        while i < len(lines):
-            # We are at the first line of group or sub-group.
-            sha, ln_orig, ln_final, ln_group = lines[i].split()
-            ln_group = int(ln_group)
-
-            num_lines_total += ln_group
-
-            if sha not in shas:
-                shas.add(sha)
-
-                # We are at a new commit group. Figure out the author.
-                author_name, author_email = None, None
-                while not (author_name and author_email):
-                    i += 1
-                    components = lines[i].split(" ")
-                    if components[0] == 'author':
-                        author_name = " ".join(components[1:])
-                    elif components[0] == 'author-mail':
-                        author_email = " ".join(components[1:]).strip("<").strip(">")
-
-                # Add line count to author.
-                person = self._find_author(name=author_name, email=author_email,
+        for group in groups:
+            num_lines_total += group.count
+
+            if group.sha in contributions:
+                contributions[group.sha].num_lines += group.count
+            else:
+                # We are at a new commit. Figure out the author.
+                name, email = group.author()
+                person = self._find_author(name=name, email=email,
                         add_author=True)
+                contributions[group.sha] = Contribution(person, group.count)
+
+        return contributions, num_lines_total
+
+    def _churn(self, rev):
+        """
+        Return the churn.Churn of the whole repository at rev, reading the
+        history if self.churn isn't up to date with it.
+        """
+
+        sha = self._rev_parse(rev)
+        if self.churn is None or self.churn.rev != sha:
+            self.churn = churn.Churn(sha)
+            log = self._git_lines('log', sha, **history.NUMSTAT_KWARGS)
+            for commit in history.parse_numstat(log):
+                person = self._find_author(name=commit.name,
+                        email=commit.email, add_author=True)
+                self.churn.add_commit(person, commit)
+        return self.churn
+
+    def _tree_contributions(self, kind, block, rev):
+        """
+        Return (contributions, num_lines_total) of the given kind ('history'
+        or 'blame') of a directory or glob pattern block at rev: those of the
+        files in it, summed commit by commit.
+
+        The results of every file and directory are kept in self.tree, so that
+        later queries about the same or enclosing directories reuse them.
+        self.tree holds one commit at a time. Moving it to a descendant only
+        forgets the files changed in between and the directories they are in.
+        """
+
+        self._update_tree(self._rev_parse(rev))
+        if block.is_glob():
+            return self._sum_contributions([self._file_contributions(kind, path)
+                for path in self.tree.match(block.filename)])
+        return self._directory_contributions(kind, block.filename.rstrip('/'))
+
+    def _directory_contributions(self, kind, directory):
+        """
+        Return (contributions, num_lines_total) of the given kind of the files
+        under directory in self.tree, from those of its children.
+        """
+
+        found = self.tree.directories.get((kind, directory))
+        if found is not None:
+            return found
+
+        children = self.tree.children(directory)
+        if children is None:
+            raise KeyError("no such directory at %s: %s" % (self.tree.rev,
+                directory))
+        subdirectories, paths = children
+        parts = [self._directory_contributions(kind, subdirectory)
+                for subdirectory in subdirectories]
+        parts.extend(self._file_contributions(kind, path) for path in paths)
+
+        found = self.tree.directories[(kind, directory)] = \
+                self._sum_contributions(parts)
+        return found
+
+    def _file_contributions(self, kind, path):
+        """
+        Return (contributions, num_lines_total) of the given kind of the file
+        path in self.tree.
+        """
+
+        found = self.tree.files.get((kind, path))
+        if found is None:
+            if kind == 'blame':
+                found = self._lines_contributed(path, self.tree.rev)
+            else:
+                found = self._lines_contributed_history(path, self.tree.rev)
+            self.tree.files[(kind, path)] = found
+        return found
+
+    def _sum_contributions(self, parts):
+        """
+        Given a list of (contributions, num_lines_total), return their sum.
+        """
+
+        contributions = {}
+        num_lines_total = 0
+        for part, num_lines in parts:
+            for sha, contribution in part.items():
                 if sha in contributions:
-                    contributions[sha]['num_lines'] += ln_group
+                    contributions[sha].num_lines += contribution.num_lines
                 else:
-                    contributions[sha] = {'person': person,
-                            'num_lines': ln_group}
-                
-                # We got the data we want. Spin until we get to 'filename', which
-                # marks the end of this sub-group.
-                i = util.spin_lines_until(lines, i, 'filename')
-
-                # We are now one line past 'filename'. The next line should contain
-                # a SHA.
-            else:
-                # We are in an old sub-group, so update author's contributions.
-                contributions[sha]['num_lines'] += ln_group
-                i = util.spin_lines_until(lines, i, 'filename')
+                    contributions[sha] = Contribution(contribution.person,
+                            contribution.num_lines)
+            num_lines_total += num_lines
+        return contributions, num_lines_total
+
+    def _update_tree(self, rev):
+        """
+        Move self.tree to commit hash rev, keeping the results of the files
+        that didn't change on the way, if rev descends from where it was.
+        """
+
+        old = self.tree.rev
+        if old == rev:
+            return
+
+        changed = None
+        if old is not None and self._is_ancestor(old, rev):
+            # Every path any commit in between touched, even if it was put back
+            # the way it was, since its history still changed.
+            out = self._git('log', '%s..%s' % (old, rev), format='',
+                    name_only=True, m=True, no_renames=True)
+            changed = set(util.unquote_path(line) for line in out.splitlines()
+                    if line)
+        self.tree.update(rev, self._ls_files(rev), changed)
+
+    def _known_contributions(self, kind, rev, block):
+        """
+        Return (rev, found), where found is the (contributions,
+        num_lines_total) of the given kind ('history' or 'blame') of block at
+        rev, if the index or the cache has them, and None otherwise. With a
+        cache, rev comes back as a commit hash, since that is how the cache
+        knows commits.
+        """
+
+        found = self._index_contributions(kind, rev, block)
+        if found is not None:
+            return rev, found
+
+        if self.cache is not None:
+            rev = self._rev_parse(rev)
+            found = self._load_contributions(kind, rev, block)
+            if found is not None and kind == 'blame':
+                self._save_index_blame(rev, block, found[0])
+        return rev, found
+
+    def _remember_contributions(self, kind, rev, block, contributions):
+        """
+        Save new contributions of the given kind of block at rev to the cache
+        and the index.
+        """
+
+        if self.cache is not None:
+            self._save_contributions(kind, rev, block, contributions)
+            if kind.startswith('history'):
+                self.cache.put_many('datetime', dict((sha, self.datetimes[sha])
+                    for sha in contributions))
+        if kind == 'blame':
+            self._save_index_blame(rev, block, contributions)
+
+    def _index_contributions(self, kind, rev, block):
+        """
+        Return the contributions and total number of lines of the given kind
+        ('history' or 'blame') for block at rev from self.index, or None if
+        the index can't tell, e.g. because it isn't up to date with rev.
+        """
+
+        if kind not in ('history', 'blame') or not self._index_knows(rev,
+                block):
+            return None
+        rows = self.index.rows(kind, block.filename)
+        if rows is None:
+            return None
+
+        for sha, name, email, num_lines, then in rows:
+            if then is not None:
+                self.datetimes[sha] = then
+        return self._contributions_from_rows([row[:4] for row in rows])
+
+    def _index_scores(self, kind, block, timenow=None, aging=None):
+        """
+        Return the unnormalized {Person: score} of the given kind ('history'
+        or 'blame') for block, as _score_author_contributions would, summed
+        straight from self.index. Returns None if the index can't tell.
+        """
+
+        rev = block.rev or 'HEAD'
+        if kind not in ('history', 'blame') or not self._index_knows(rev,
+                block):
+            return None
+        if kind == 'history' and self._lineage(block, rev):
+            # The index only has the history of the file under its path now.
+            return None
+        rows = self.index.person_lines(kind, block.filename)
+        if rows is None:
+            return None
+
+        now = timenow if timenow else time.time()
+        people = self._index_people()
+        scores = {}
+        for person_id, num_lines, then in rows:
+            score = float(num_lines)
+            if aging == 'exp':
+                if then is None:
+                    # Blamed on a commit the index has no time for.
+                    return None
+                score *= self._aging_exp(float(now - then) / 60 / 60 / 24)
+            person = people[person_id]
+            scores[person] = scores.get(person, 0) + score
+        return scores
+
+    def _index_people(self):
+        """
+        Return the list of the Person of each of self.index.people, finding
+        only those that weren't found before.
+        """
+
+        if self._index_authors_of is not self.index:
+            self._index_authors = []
+            self._index_authors_of = self.index
+        for name, email in self.index.people[len(self._index_authors):]:
+            self._index_authors.append(self._find_author(name=name,
+                email=email, add_author=True))
+        return self._index_authors
+
+    def _index_knows(self, rev, block):
+        """
+        Return True if self.index is up to date with rev, and block is a whole
+        file, which is all the index holds.
+        """
+        return (self.index is not None and not block.is_range() and
+                self._rev_parse(rev) == self.index.head)
+
+    def _save_index_blame(self, rev, block, contributions):
+        """
+        Save blame contributions in self.index, if it is up to date with rev.
+        """
+        if self._index_knows(rev, block):
+            self.index.set_blame(block.filename,
+                    self._contributions_to_rows(contributions))
+
+    def _load_contributions(self, kind, rev, block):
+        """
+        Return the contributions and total number of lines that were saved in
+        the cache for (kind, rev, block), or None if there are none.
+        """
+
+        rows = self.cache.get(kind, rev, block.key())
+        if rows is None:
+            return None
+        return self._contributions_from_rows(rows)
+
+    def _save_contributions(self, kind, rev, block, contributions):
+        """
+        Save contributions in the cache for (kind, rev, block). rev must be a
+        commit hash.
+        """
+        self.cache.put(kind, rev, self._contributions_to_rows(contributions),
+                path=block.key())
+
+    def _contributions_to_rows(self, contributions):
+        """
+        Flatten contributions to a list of (sha, name, email, num_lines) rows,
+        which can be stored or sent to another process, unlike Person objects.
+        """
+
+        rows = []
+        for sha, contribution in contributions.items():
+            person = contribution.person
+            rows.append((sha, person.name, person.email,
+                contribution.num_lines))
+        return rows
+
+    def _contributions_from_rows(self, rows):
+        """
+        The inverse of _contributions_to_rows. Returns the contributions and
+        the total number of lines, with authors found in self.authors.
+        """
+
+        contributions = {}
+        num_lines_total = 0
+        for sha, name, email, num_lines in rows:
+            person = self._find_author(name=name, email=email, add_author=True)
+            contributions[sha] = Contribution(person, num_lines)
+            num_lines_total += num_lines
         return contributions, num_lines_total
 
+    def _log_range(self, block):
+        """
+        Return the range of block as understood by git log -L, e.g.
+        '10,40:path/to/file'.
+        """
+        return '%s:%s' % (block.line_range(), block.filename)
+
+    def _ls_files(self, rev='HEAD'):
+        """
+        Return the paths of all files in the tree of rev.
+        """
+        out = self._git('ls_tree', rev, r=True, name_only=True, z=True)
+        return [path for path in out.split('\0') if path]
+
+    def _ls_blobs(self, rev='HEAD'):
+        """
+        Return a dict {path: blob hash} of all files in the tree of rev.
+        """
+
+        blobs = {}
+        out = self._git('ls_tree', rev, r=True, z=True)
+        for entry in out.split('\0'):
+            if not entry:
+                continue
+            # <mode> SP <type> SP <object> TAB <path>
+            info, path = entry.split('\t', 1)
+            mode, type, sha = info.split()
+            if type == 'blob':
+                blobs[path] = sha
+        return blobs
+
+    def _is_ancestor(self, old, new):
+        """
+        Return True if commit old is an ancestor of (or the same as) new.
+        """
+        try:
+            self._git('merge_base', old, new, is_ancestor=True)
+        except git.GitCommandError:
+            return False
+        return True
+
+    def _git_lines(self, command, *args, **kwargs):
+        """
+        Run the git command with the given arguments, and yield the lines of
+        its output, without line endings, as git writes them. This lets us
+        start on the output before git is done, and never hold all of it.
+        """
+
+        start = stats.timer()
+        num_bytes = 0
+        proc = getattr(self.repo.git, command)(*args, as_process=True,
+                **kwargs)
+        try:
+            for line in proc.stdout:
+                num_bytes += len(line)
+                yield safe_decode(line.rstrip(b'\n'))
+
+            # Raises GitCommandError if git failed.
+            proc.wait()
+        except GeneratorExit:
+            # We were closed before the end, so git is of no use anymore.
+            proc.proc.kill()
+            proc.proc.wait()
+            raise
+        finally:
+            if self.stats is not None:
+                # For git, this includes the time we took to read its output.
+                self.stats.add_git(command, stats.timer() - start, num_bytes)
+
+    def _git(self, command, *args, **kwargs):
+        """
+        Run the git command with the given arguments, and return its output.
+        """
+
+        if self.stats is None:
+            return getattr(self.repo.git, command)(*args, **kwargs)
+
+        start = stats.timer()
+        out = ''
+        try:
+            out = getattr(self.repo.git, command)(*args, **kwargs)
+            return out
+        finally:
+            self.stats.add_git(command, stats.timer() - start, len(out))
+
+    def _rev_parse(self, rev):
+        """
+        Return the commit hash of rev.
+        """
+        if util.is_sha(rev):
+            return rev
+        # GitPython resolves names by reading the refs itself, without running
+        # git, so a cache hit really costs no git calls.
+        return self.repo.rev_parse(rev).hexsha
+
     def _aging_exp(self, days, lmb=0.005, min_val=0.1):
         """
         """
@@ -294,22 +1382,37 @@ class Search(object):
         Given an object hash, return the unix time that object was created.
         """
 
-        # The format documentation can be found at "man git-show". %H is the
-        # commit hash and %at is the author-date in unix time.
-        show = self.repo.git.show(rev, format="%H%n%at", name_only=True)
-        lines = show.splitlines()
-        return int(lines[1])
+        if rev in self.datetimes:
+            return self.datetimes[rev]
+        return self._datetimes([rev])[rev]
 
+    @stats.timed
     def _datetimes(self, revs):
         """
         Given a list of revisions, return a dict {commit hash: unix time}
 
-        git show --format="commit: %H%nauthor-date: %at" --name-only e22109ebd4b5cf1e0efbef2f6ecc5f257efc24be
+        Times already in self.datetimes (or the persistent cache) are reused.
+        The rest are read from the commit objects through self.catfile, which
+        doesn't start a new git process per commit, and saved in
+        self.datetimes.
         """
-        datetimes = {}
-        for rev in revs:
-            datetimes[rev] = self._datetime(rev)
-        return datetimes
+
+        # Names like HEAD can move, so we only ever cache by commit hash.
+        shas = dict((rev, self._rev_parse(rev)) for rev in revs)
+
+        missing = set(sha for sha in shas.values() if sha not in self.datetimes)
+        if missing and self.cache is not None:
+            self.datetimes.update(self.cache.get_many('datetime', missing))
+            missing = [sha for sha in missing if sha not in self.datetimes]
+
+        for sha in missing:
+            self.datetimes[sha] = self.catfile.commit(sha).author_time
+
+        if missing and self.cache is not None:
+            self.cache.put_many('datetime', dict((sha, self.datetimes[sha])
+                for sha in missing))
+
+        return dict((rev, self.datetimes[sha]) for rev, sha in shas.items())
 
     def _days_since(self, rev, timenow=None):
         now = timenow if timenow else time.time()
@@ -318,25 +1421,144 @@ class Search(object):
         return diff / 60 / 60 / 24
 
 
-class Person(object):
-    def __init__(self, name=None, email=None):
-        self.name = name
-        self.email = email
+# Search.score_many runs these in its worker processes. Each worker opens the
+# repository once and keeps its Search, with its authors and caches, for all
+# the blocks it is given.
+_worker_search = None
 
-    def __eq__(self, person):
-        return self.name == person.name and self.email == person.email
+def _init_worker(repo_path, options):
+    global _worker_search
+    _worker_search = Search(repo_path, **options)
 
-    def __str__(self):
-        return "Name: %s, Email: %s" % (self.name, self.email)
+def _score_worker(args):
+    block, contributions_method, errors = args
+    return _score_block(_worker_search, block, contributions_method, errors)
+
+def _score_block(search, block, contributions_method, errors=False):
+    """
+    Return (block, rows, datetimes, None) for block, where rows are the
+    contributions found by the named method of search, flattened by
+    _contributions_to_rows, and datetimes has the times of those commits that
+    search already knows. If errors is True and block can't be scored, return
+    (block, None, None, the exception) instead.
+    """
+
+    try:
+        contributions, num_lines_total = getattr(search,
+                contributions_method)(block)
+    except (git.GitCommandError, KeyError, ValueError) as e:
+        if not errors:
+            raise
+        return block, None, None, e
+    datetimes = dict((sha, search.datetimes[sha]) for sha in contributions
+            if sha in search.datetimes)
+    return block, search._contributions_to_rows(contributions), datetimes, None
+
+
+class Contribution(object):
+    """
+    The num_lines lines of a block a commit contributed, and the Person who
+    made the commit. There is one of these for every commit of every block
+    scored, so they are kept small.
+    """
+
+    __slots__ = ('person', 'num_lines')
+
+    def __init__(self, person, num_lines):
+        self.person = person
+        self.num_lines = num_lines
+
+    def __eq__(self, contribution):
+        return (isinstance(contribution, Contribution) and
+                self.person == contribution.person and
+                self.num_lines == contribution.num_lines)
+
+    def __ne__(self, contribution):
+        return not self == contribution
 
     def __repr__(self):
-        return object.__repr__(self) + (" (Name: %s, Email: %s)" % (self.name, self.email))
+        return 'Contribution(%r, %d)' % (self.person, self.num_lines)
+
 
 class Block(object):
     """
-    A Block is a git blob (file).
+    A Block is a git blob (file), or a range of lines of one.
+
+    start and end are line numbers, counting from 1, and both included, as in
+    git blame -L. Without them, the block is the whole file. rev is the
+    revision the line numbers refer to, HEAD if not given.
+
+    Everywhere a block is expected, a plain file name will do as well.
+
+    A file name ending in '/' names a directory. With glob, the file name is
+    a glob pattern instead, where '*' matches '/' too; as a plain file name,
+    that is written 'glob:' followed by the pattern. Such a block stands for
+    all the files in it, and can't be a range of lines.
     """
 
-    def __init__(self, filename):
+    GLOB_PREFIX = 'glob:'
+
+    def __init__(self, filename, start=None, end=None, rev=None, glob=False):
         self.filename = filename
+        self.start = start
+        self.end = end
+        self.rev = rev
+        self.glob = glob
+
+    @classmethod
+    def of(cls, block):
+        """
+        Return block as a Block, if it is a file name.
+        """
+        if isinstance(block, Block):
+            return block
+        if block.startswith(cls.GLOB_PREFIX):
+            return cls(block[len(cls.GLOB_PREFIX):], glob=True)
+        return cls(block)
 
+    def is_range(self):
+        return self.start is not None or self.end is not None
+
+    def is_tree(self):
+        """
+        Return True if the block is a directory or a glob pattern.
+        """
+        return self.filename.endswith('/') or self.is_glob()
+
+    def is_glob(self):
+        return self.glob
+
+    def line_range(self):
+        """
+        Return the range as understood by git blame -L, e.g. '10,40'.
+        """
+        return '%s,%s' % (self.start or 1, self.end or '')
+
+    def key(self):
+        """
+        Return a string telling this block apart from other blocks of the
+        same revision, e.g. for caching.
+        """
+        if self.is_range():
+            return '%s:%s' % (self.filename, self.line_range())
+        if self.glob:
+            return self.GLOB_PREFIX + self.filename
+        return self.filename
+
+    def __eq__(self, block):
+        return (isinstance(block, Block) and self.key() == block.key() and
+                self.rev == block.rev)
+
+    def __ne__(self, block):
+        return not self == block
+
+    def __hash__(self):
+        return hash((self.key(), self.rev))
+
+    def __str__(self):
+        if self.rev is not None:
+            return '%s:%s' % (self.rev, self.key())
+        return self.key()
+
+    def __repr__(self):
+        return object.__repr__(self) + (" (%s)" % self)
@@ -0,0 +1,246 @@
+"""
+A long-running query server.
+
+A script that makes a Search for every query pays for opening the repository,
+finding the authors and doing all the git work again every time. Service
+keeps a Search per repository, and the contributions it has found, for as
+long as it runs, and Server answers queries about them over HTTP with JSON:
+
+    $ python -m carnival.server --port 8321 myrepo=/path/to/repository
+
+    POST /score     {"repo": "myrepo", "block": "src/main.py",
+                     "method": "all_commits", "timenow": null}
+                    -> {"block": ..., "rev": ..., "scores": [
+                           {"name": ..., "email": ..., "score": ...}, ...]}
+    POST /top       the same, with "k": 5, for the k best people only
+    POST /refresh   {"repo": "myrepo"}, after HEAD moved
+                    -> {"repo": "myrepo", "head": <commit hash>}
+    GET  /repos     -> {"myrepo": <commit hash of HEAD>, ...}
+
+A block is a path, a directory, 'glob:' and a glob pattern (see search.Block),
+or a dict {"path": ..., "start": ..., "end": ..., "rev": ..., "glob": ...}. method is one of the
+methods of Search.score_many. Scores are listed best first.
+
+Queries about different repositories run at the same time. Queries about the
+same repository take turns, since a Search isn't safe to share between
+threads; once its contributions are found, a query takes next to no time.
+
+Only the repositories the server was started with can be asked about, and it
+only listens on localhost by default. There is no authentication.
+"""
+
+import argparse
+import collections
+import json
+import threading
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+import git
+
+from . import search
+
+class Service(object):
+    """
+    Answers queries about the repositories in repos, a dict {name: path}.
+    options are passed on to every Search, e.g. cache_dir or index_path.
+
+    The contributions of at most max_contributions blocks are kept per
+    repository; beyond that, those used least recently are dropped.
+    """
+
+    def __init__(self, repos, max_contributions=4096, **options):
+        self.searches = {}      # {name: Search}
+        self.locks = {}         # {name: Lock}
+        # {name: OrderedDict {(contributions method, commit hash, block key):
+        #   contributions}}, least recently used first.
+        self.contributions = {}
+        self.max_contributions = max_contributions
+
+        for name, path in repos.items():
+            self.searches[name] = search.Search(path, **options)
+            self.locks[name] = threading.Lock()
+            self.contributions[name] = collections.OrderedDict()
+
+    def close(self):
+        for s in self.searches.values():
+            s.close()
+
+    def repos(self):
+        """
+        Return a dict {name: commit hash of HEAD}.
+        """
+        heads = {}
+        for name in self.searches:
+            with self.locks[name]:
+                heads[name] = self.searches[name]._rev_parse('HEAD')
+        return heads
+
+    def score(self, repo, block, method='all_commits', timenow=None, k=None):
+        """
+        Return (rev, scores) for block of repo, as the score_* method would
+        give them, where rev is the commit hash scored and scores is a list
+        of (Person, score), best first. If k is given, only the k best people
+        are given.
+
+        The contributions found are kept until the next refresh, keyed by
+        commit hash, so they stay right even if HEAD moves before then.
+        """
+
+        contributions_method, aging = search.Search.METHODS[method]
+        s, lock = self._search(repo)
+        block = search.Block.of(block)
+        with lock:
+            rev = s._rev_parse(block.rev or 'HEAD')
+            key = (contributions_method, rev, block.key())
+            known = self.contributions[repo]
+            found = known.pop(key, None)
+            if found is None:
+                found = getattr(s, contributions_method)(block, rev)
+                while len(known) >= self.max_contributions:
+                    known.popitem(last=False)
+            known[key] = found
+            scores = s._score_author_contributions(found[0], timenow=timenow,
+                    aging=aging, normalize=False)
+        return rev, search.top(scores, len(scores) if k is None else k,
+                normalize=True)
+
+    def refresh(self, repo):
+        """
+        Bring what is known about repo up to date with its HEAD: refresh the
+        index, if the Search has one, and forget the contributions found at
+        older commits. Return the commit hash of HEAD.
+        """
+
+        s, lock = self._search(repo)
+        with lock:
+            head = s._rev_parse('HEAD')
+            if s.index is not None:
+                s.refresh_index(head, blame=False)
+            self.contributions[repo] = collections.OrderedDict((key, found)
+                    for key, found in self.contributions[repo].items()
+                    if key[1] == head)
+        return head
+
+    def _search(self, repo):
+        if repo not in self.searches:
+            raise LookupError("no such repository: %s" % repo)
+        return self.searches[repo], self.locks[repo]
+
+
+class Server(ThreadingMixIn, HTTPServer):
+    """
+    An HTTP server for service, answering every request in a thread of its
+    own. Use port 0 to have a free port picked; server_address tells which.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, service, address=('127.0.0.1', 0)):
+        HTTPServer.__init__(self, address, Handler)
+        self.service = service
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == '/repos':
+            self._answer(self.server.service.repos)
+        else:
+            self._send(404, {'error': "no such endpoint: %s" % self.path})
+
+    def do_POST(self):
+        endpoints = {'/score': self._score, '/top': self._score,
+                '/refresh': self._refresh}
+        if self.path not in endpoints:
+            self._send(404, {'error': "no such endpoint: %s" % self.path})
+            return
+
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            query = json.loads(self.rfile.read(length).decode('utf-8') or '{}')
+            if not isinstance(query, dict):
+                raise ValueError("expected a JSON object")
+        except ValueError as e:
+            self._send(400, {'error': "bad request: %s" % e})
+            return
+        self._answer(lambda: endpoints[self.path](query))
+
+    def _score(self, query):
+        k = query.get('k', 5 if self.path == '/top' else None)
+        block = query['block']
+        if isinstance(block, dict):
+            block = search.Block(block['path'], block.get('start'),
+                    block.get('end'), block.get('rev'),
+                    block.get('glob', False))
+        rev, scores = self.server.service.score(query['repo'], block,
+                method=query.get('method', 'all_commits'),
+                timenow=query.get('timenow'), k=k)
+        return {'block': str(block), 'rev': rev, 'scores': [{'name':
+            person.name, 'email': person.email, 'score': score}
+            for person, score in scores]}
+
+    def _refresh(self, query):
+        repo = query['repo']
+        return {'repo': repo, 'head': self.server.service.refresh(repo)}
+
+    def _answer(self, answer):
+        """
+        Send what answer() returns, or the error it raises.
+        """
+        try:
+            result = answer()
+        except (LookupError, ValueError, TypeError, git.GitCommandError) as e:
+            # LookupError covers missing fields, unknown methods and
+            # repositories, and git tells us about unknown paths and revisions.
+            self._send(400, {'error': "bad request: %s" % e})
+        except Exception as e:
+            self._send(500, {'error': "%s: %s" % (type(e).__name__, e)})
+        else:
+            self._send(200, result)
+
+    def _send(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        # Queries are too frequent to log to stderr one by one.
+        pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Answer expert search "
+            "queries about git repositories over HTTP.")
+    parser.add_argument('repos', nargs='+', metavar='NAME=PATH',
+            help="a repository to answer queries about, and its name")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8321)
+    parser.add_argument('--cache-dir', help="keep a persistent cache here")
+    parser.add_argument('--mailmap', action='store_true',
+            help="merge authors using each repository's .mailmap")
+    parser.add_argument('--max-contributions', type=int, default=4096,
+            help="keep the contributions of this many blocks per repository")
+    args = parser.parse_args(argv)
+
+    repos = dict(repo.split('=', 1) for repo in args.repos)
+    service = Service(repos, max_contributions=args.max_contributions,
+            mailmap=args.mailmap, cache_dir=args.cache_dir)
+    server = Server(service, (args.host, args.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+"""
+Finding where a snippet of code lives in a repository.
+
+Users have a snippet of code, not a path and a range of lines. To find the
+snippet, we index every file of a tree by shingles: hashes of every run of
+shingle_size consecutive lines, after normalising the lines so that changes in
+indentation and blank lines don't matter. A snippet is then looked up by its
+own shingles, and every hit votes for the place in a file where the snippet
+would start if the hit is right. The places with the most votes win.
+
+The shingle hashes are rolling hashes over the hashes of the lines, so each
+shingle costs the same no matter how large shingle_size is.
+"""
+
+import zlib
+
+# For the rolling hash: H(l_1..l_k) = sum(h(l_i) * BASE**(k - i)) % MOD.
+BASE = 1000003
+MOD = (1 << 61) - 1
+
+class SnippetIndex(object):
+    """
+    A shingle index of the files in the tree of one revision (rev). Files are
+    known by the blob hash of their contents, so moving to another revision
+    only indexes the files that changed.
+    """
+
+    def __init__(self, shingle_size=3):
+        self.shingle_size = shingle_size
+        self.rev = None
+
+        self.blobs = {}         # {path: blob hash}
+        self.shingles = {}      # {shingle hash: set((path, position))}
+
+        # Per path, the shingle hashes of the path, to remove them again, and
+        # the line number of each normalised line.
+        self._path_shingles = {}    # {path: [shingle hash]}
+        self._line_numbers = {}     # {path: [line number]}
+
+    def update(self, rev, entries, read_blob):
+        """
+        Bring the index up to date with the tree of rev. entries is a dict
+        {path: blob hash} of the files of the tree, and read_blob a function
+        returning the contents of a blob, given its hash.
+        """
+
+        for path in list(self.blobs):
+            if entries.get(path) != self.blobs[path]:
+                self._remove(path)
+
+        for path, blob in entries.items():
+            if path not in self.blobs:
+                self._add(path, blob, read_blob(blob))
+        self.rev = rev
+
+    def find(self, snippet, limit=5):
+        """
+        Return up to limit (path, start, end, score) tuples for the places
+        snippet is most likely to be, best first. start and end are line
+        numbers, counting from 1, and score is the fraction of the snippet's
+        shingles found in that place.
+
+        A snippet with fewer than shingle_size non-blank lines can't be found.
+        """
+
+        lines = [line for number, line in normalize(snippet)]
+        hashes = self._hashes(lines)
+        if not hashes:
+            return []
+
+        votes = {}  # {(path, position of first line): number of votes}
+        for offset, shingle in enumerate(hashes):
+            for path, position in self.shingles.get(shingle, ()):
+                key = (path, position - offset)
+                votes[key] = votes.get(key, 0) + 1
+
+        best = sorted(votes.items(), key=lambda item: -item[1])[:limit]
+
+        found = []
+        for (path, first), num_votes in best:
+            numbers = self._line_numbers[path]
+            last = min(first + len(lines) - 1, len(numbers) - 1)
+            first = max(first, 0)
+            found.append((path, numbers[first], numbers[last],
+                float(num_votes) / len(hashes)))
+        return found
+
+    def _add(self, path, blob, data):
+        if b'\0' in data[:8000]:
+            # Like git, we take this to mean the file is binary, and there is
+            # no code to find in it.
+            numbered = []
+        else:
+            numbered = normalize(data)
+        hashes = self._hashes([line for number, line in numbered])
+        for position, shingle in enumerate(hashes):
+            self.shingles.setdefault(shingle, set()).add((path, position))
+
+        self.blobs[path] = blob
+        self._path_shingles[path] = hashes
+        self._line_numbers[path] = [number for number, line in numbered]
+
+    def _remove(self, path):
+        for position, shingle in enumerate(self._path_shingles.pop(path, ())):
+            places = self.shingles[shingle]
+            places.discard((path, position))
+            if not places:
+                del self.shingles[shingle]
+        self._line_numbers.pop(path, None)
+        del self.blobs[path]
+
+    def _hashes(self, lines):
+        """
+        Return the hashes of every run of shingle_size lines of lines.
+        """
+
+        k = self.shingle_size
+        if len(lines) < k:
+            return []
+
+        line_hashes = [zlib.crc32(line.encode('utf-8')) & 0xffffffff
+                for line in lines]
+        top = pow(BASE, k - 1, MOD)     # The weight of the line leaving.
+
+        h = 0
+        for line_hash in line_hashes[:k]:
+            h = (h * BASE + line_hash) % MOD
+        hashes = [h]
+        for i in range(k, len(line_hashes)):
+            h = ((h - line_hashes[i - k] * top) * BASE + line_hashes[i]) % MOD
+            hashes.append(h)
+        return hashes
+
+
+def normalize(text):
+    """
+    Return a list of (line number, normalised line) for the non-blank lines
+    of text. Normalising strips leading and trailing white space and squeezes
+    the rest, so that re-indented code still matches.
+    """
+
+    if isinstance(text, bytes):
+        text = text.decode('utf-8', 'replace')
+
+    numbered = []
+    # Only newlines end lines, as far as git is concerned.
+    for number, line in enumerate(text.split('\n'), 1):
+        line = ' '.join(line.split())
+        if line:
+            numbered.append((number, line))
+    return numbered
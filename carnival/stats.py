@@ -0,0 +1,108 @@
+"""
+Where the time of a Search goes.
+
+Instrumentation is off unless a Search is given a Stats to record into. A
+Stats counts, for every git command, how often it ran, how long it took and
+how many bytes of output it gave, and for every stage of scoring (a method of
+Search, e.g. _rev_list or _find_author), how often it ran and how long it
+took. Stages nest, so the time of a stage includes that of the stages and git
+commands it runs.
+
+To forward the numbers to a metrics system as they come, give the Stats a
+callback, which is called as
+
+    callback(kind, name, seconds, num_bytes)
+
+with kind 'git' or 'stage', after every git command and stage.
+"""
+
+import functools
+import threading
+import timeit
+
+timer = timeit.default_timer
+
+class Counter(object):
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.bytes = 0
+
+    def as_dict(self):
+        return {'count': self.count, 'seconds': self.seconds,
+                'bytes': self.bytes}
+
+    def __repr__(self):
+        return 'Counter(count=%d, seconds=%f, bytes=%d)' % (self.count,
+                self.seconds, self.bytes)
+
+
+class Stats(object):
+    """
+    git is a dict {git command: Counter}, and stages a dict {stage: Counter}.
+    A Stats can be shared by Searches in many threads.
+    """
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.git = {}
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def add_git(self, command, seconds, num_bytes=0):
+        """
+        Record a run of the git command, e.g. 'blame'.
+        """
+        self._add(self.git, 'git', command.replace('_', '-'), seconds,
+                num_bytes)
+
+    def add_stage(self, stage, seconds):
+        """
+        Record a run of a stage.
+        """
+        self._add(self.stages, 'stage', stage, seconds, 0)
+
+    def as_dict(self):
+        """
+        Return everything recorded so far as plain dicts, e.g. to dump as
+        JSON.
+        """
+        with self._lock:
+            return {'git': dict((name, counter.as_dict())
+                        for name, counter in self.git.items()),
+                    'stages': dict((name, counter.as_dict())
+                        for name, counter in self.stages.items())}
+
+    def reset(self):
+        with self._lock:
+            self.git = {}
+            self.stages = {}
+
+    def _add(self, counters, kind, name, seconds, num_bytes):
+        with self._lock:
+            counter = counters.get(name)
+            if counter is None:
+                counter = counters[name] = Counter()
+            counter.count += 1
+            counter.seconds += seconds
+            counter.bytes += num_bytes
+        if self.callback is not None:
+            self.callback(kind, name, seconds, num_bytes)
+
+
+def timed(method):
+    """
+    Decorate a method of an object with a stats attribute, to record its runs
+    as a stage of the same name if stats isn't None.
+    """
+
+    @functools.wraps(method)
+    def timed_method(self, *args, **kwargs):
+        if self.stats is None:
+            return method(self, *args, **kwargs)
+        start = timer()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self.stats.add_stage(method.__name__, timer() - start)
+    return timed_method
@@ -0,0 +1,85 @@
+"""
+Scores at many points in time from one pass over a block's history.
+
+The score of a person at time t counts the contributions made up to t, each
+aged by how old it is at t:
+
+    weight = max(min_val, exp(-lmb * days))
+
+We go through the points in time in order, keeping for every person the sum
+of the weights of their contributions so far, in two parts:
+
+    clamped     contributions old enough to weigh min_val; these never change
+                again
+    fresh       the rest, whose weights all shrink by the same factor
+                exp(-lmb * days) as time moves on by days
+
+so moving from one point in time to the next only touches the contributions
+made or clamped in between, plus one multiplication per person.
+"""
+
+import math
+
+SECONDS_PER_DAY = 60 * 60 * 24
+
+def snapshots(contributions, timepoints, lmb=0.005, min_val=0.1, aging='exp'):
+    """
+    Given a list of (unix time, Person, num_lines) contributions and a list of
+    points in (unix) time, return a list of (timepoint, {Person: score}) with
+    the normalised scores at each point in time, in order of time.
+
+    With aging None, contributions aren't aged, and the scores are those of
+    score_all_commits over the contributions made up to each point in time.
+    """
+
+    contributions = sorted(contributions, key=lambda c: c[0])
+    aging = aging == 'exp' and lmb > 0
+    if aging:
+        # Contributions this many days old, or older, weigh min_val.
+        clamp_days = math.log(1.0 / min_val) / lmb if min_val > 0 else None
+
+    fresh = {}      # {Person: sum of the current weights of fresh contributions}
+    clamped = {}    # {Person: lines of clamped contributions}
+    first_fresh = 0     # Index of the oldest fresh contribution.
+    added = 0           # Number of contributions added so far.
+    now = None
+
+    result = []
+    for timepoint in sorted(timepoints):
+        if aging and now is not None:
+            decay = math.exp(-lmb * (timepoint - now) / SECONDS_PER_DAY)
+            for person in fresh:
+                fresh[person] *= decay
+        now = timepoint
+
+        # Add the contributions made since the last point in time.
+        while added < len(contributions) and contributions[added][0] <= now:
+            then, person, num_lines = contributions[added]
+            weight = num_lines
+            if aging:
+                weight *= math.exp(-lmb * (now - then) / SECONDS_PER_DAY)
+            fresh[person] = fresh.get(person, 0.0) + weight
+            added += 1
+
+        # Move the contributions that got old enough over to clamped.
+        while aging and clamp_days is not None and first_fresh < added:
+            then, person, num_lines = contributions[first_fresh]
+            days = float(now - then) / SECONDS_PER_DAY
+            if days < clamp_days:
+                break
+            fresh[person] -= num_lines * math.exp(-lmb * days)
+            clamped[person] = clamped.get(person, 0) + num_lines
+            first_fresh += 1
+
+        scores = {}
+        for person, weight in fresh.items():
+            scores[person] = max(weight, 0.0)
+        for person, num_lines in clamped.items():
+            scores[person] = scores.get(person, 0.0) + num_lines * min_val
+
+        total = sum(scores.values())
+        if total:
+            for person in scores:
+                scores[person] /= total
+        result.append((timepoint, scores))
+    return result
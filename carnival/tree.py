@@ -0,0 +1,106 @@
+"""
+Contributions of the files and directories of a tree.
+
+The contributions of a directory are those of the files under it, summed
+commit by commit, so they can be built from the contributions of its
+children: its files and its subdirectories. Keeping the result of every file
+and directory means a query about a directory reuses what was found for
+everything under it, and a query about a parent reuses that in turn.
+
+A Tree holds these results for one commit. When it moves on to another, only
+the files that were changed in between are forgotten, along with the
+directories they are in, so that only those are found again.
+
+The tree only holds data. Search fills it in and reads it.
+"""
+
+import fnmatch
+
+KINDS = ('history', 'blame')
+
+class Tree(object):
+    """
+    rev is the commit hash of the tree. files is a dict {(kind, path):
+    (contributions, num_lines_total)} and directories is a dict {(kind,
+    directory): (contributions, num_lines_total)}, where kind is 'history' or
+    'blame'. Directories are named without a trailing slash, and '' is the
+    top of the tree.
+    """
+
+    def __init__(self):
+        self.rev = None
+        self.paths = []
+        self.files = {}
+        self.directories = {}
+
+        self._children = {}     # {directory: ([subdirectory], [path])}
+
+    def update(self, rev, paths, changed=None):
+        """
+        Move to the tree of commit rev, whose files are paths. changed are the
+        paths that were changed on the way from self.rev, or None if nothing
+        known so far is to be kept.
+        """
+
+        if changed is None:
+            self.files.clear()
+            self.directories.clear()
+        else:
+            self.forget(changed)
+
+        self.rev = rev
+        self.paths = sorted(paths)
+        self._children = {}
+        for path in self.paths:
+            directory = _parent(path)
+            self._entry(directory)[1].append(path)
+            # Link the directory to its parents, as far as not done yet.
+            while directory:
+                parent = _parent(directory)
+                subdirectories = self._entry(parent)[0]
+                if directory in subdirectories:
+                    break
+                subdirectories.append(directory)
+                directory = parent
+
+    def forget(self, paths):
+        """
+        Forget what is known about paths, and the directories they are in.
+        """
+
+        for path in paths:
+            for kind in KINDS:
+                self.files.pop((kind, path), None)
+            directory = path
+            while directory:
+                directory = _parent(directory)
+                for kind in KINDS:
+                    self.directories.pop((kind, directory), None)
+
+    def children(self, directory):
+        """
+        Return (subdirectories, paths) of the directories and files right
+        under directory, or None if there is no such directory.
+        """
+        return self._children.get(directory.rstrip('/'))
+
+    def match(self, pattern):
+        """
+        Return the paths of the files matching the glob pattern. As with git
+        pathspecs, '*' matches '/' too.
+        """
+        return [path for path in self.paths if fnmatch.fnmatchcase(path,
+            pattern)]
+
+    def _entry(self, directory):
+        entry = self._children.get(directory)
+        if entry is None:
+            entry = self._children[directory] = ([], [])
+        return entry
+
+
+def _parent(path):
+    """
+    Return the directory path is in, '' for the top of the tree.
+    """
+    return path.rpartition('/')[0]
@@ -1,4 +1,7 @@
+import codecs
 import hashlib
+import re
+import sys
 
 def anonymize(message, algorithm='hash', salt=''):
     """
@@ -9,20 +12,54 @@ def anonymize(message, algorithm='hash', salt=''):
     """
     if algorithm == 'hash':
         m = hashlib.sha1()
-        m.update(message)
-        m.update(salt)
+        m.update(_bytes(message))
+        m.update(_bytes(salt))
         crypted = m.hexdigest()
     elif algorithm == 'simple':
         crypted = message
     return crypted
 
-def spin_lines_until(lines, i, until):
-    while True:
-        i += 1
-        components = lines[i].split(" ")
-        #print "Spinning until filename: " + lines[i]
+def _bytes(text):
+    # hashlib takes bytes only on Python 3.
+    if not isinstance(text, bytes):
+        text = text.encode('utf-8')
+    return text
 
-        if components[0] == 'filename':
-            i += 1
-            break
-    return i
+# Commit hashes are interned as they are parsed from git's output, so that
+# the many dicts keyed by them (contributions, Search.datetimes, the tree and
+# so on) share one str per commit instead of each holding a fresh copy, and
+# compare them by identity first.
+try:
+    intern = sys.intern
+except AttributeError:
+    intern = intern     # Python 2 has it built in.
+
+_SHA_RE = re.compile('^[0-9a-f]{40}$')
+
+def is_sha(rev):
+    """
+    Return True if rev is a full 40 character commit hash, rather than a
+    name like HEAD or an abbreviated hash.
+    """
+    return bool(_SHA_RE.match(rev))
+
+def unquote_path(path):
+    """
+    Undo the C-style quoting git uses for path names with unusual characters
+    in them, e.g. "dir/caf\303\251.txt".
+    """
+    if len(path) > 1 and path.startswith('"') and path.endswith('"'):
+        path = codecs.escape_decode(path[1:-1])[0]
+        if not isinstance(path, str):
+            # Python 3 gives us bytes back.
+            path = path.decode('utf-8')
+    return path
+
+def open_csv(filename):
+    """
+    Open filename for writing with the csv module, which wants bytes on
+    Python 2 and text without newline translation on Python 3.
+    """
+    if sys.version_info[0] < 3:
+        return open(filename, 'wb')
+    return open(filename, 'w', newline='')
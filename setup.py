@@ -1,4 +1,7 @@
-from distutils.core import setup
+try:
+    from setuptools import setup
+except ImportError:
+    from distutils.core import setup
 
 setup(name='carnival',
       version='1.0.0',
@@ -7,6 +10,7 @@ setup(name='carnival',
       url='http://elbenshira.com',
       description='Expert Search on Code Repositories.',
       packages=['carnival'],
+      entry_points={'console_scripts': ['carnival = carnival.cli:main']},
       )
 
 
@@ -0,0 +1,204 @@
+"""
+Benchmarks of the scoring methods on synthetic repositories.
+
+    $ python tests/benchmark.py --commits 500 --files 20 --output results.json
+
+makes a repository with fakerepo (or uses the one given with --repo), then
+scores blocks of it with each method and records, per method:
+
+    seconds         wall clock time to score all blocks
+    git_calls       number of git commands run, counting every long-lived
+                    process (e.g. cat-file --batch) once
+    peak_rss_kb     peak resident memory of the process that did the scoring
+    peak_traced_kb  peak memory allocated by Python while scoring (Python 3
+                    only, None otherwise)
+    stats           what carnival's own instrumentation (carnival.stats)
+                    recorded: every git command and stage of scoring
+
+Each method is run in a process of its own, with a fresh Search and no cache
+or index, so that methods don't warm anything up for each other and the
+memory figures are theirs alone. git's own memory isn't counted.
+
+The results are written as JSON, along with the parameters of the repository
+and the versions of Python, git and carnival, so that runs can be compared.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+import git
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+import fakerepo
+from carnival import search
+from carnival import stats
+
+METHODS = ('score_last_commit', 'score_all_commits',
+        'score_all_commits_over_time')
+
+def count_git_calls():
+    """
+    Start counting the git commands GitPython runs. Return a function that
+    stops counting and returns the count.
+    """
+
+    execute = git.cmd.Git.execute
+    calls = [0]
+
+    def counting_execute(self, *args, **kwargs):
+        calls[0] += 1
+        return execute(self, *args, **kwargs)
+
+    git.cmd.Git.execute = counting_execute
+
+    def stop():
+        git.cmd.Git.execute = execute
+        return calls[0]
+    return stop
+
+def run_method(repo_path, method, blocks, repeat):
+    """
+    Score blocks with method, repeat times over with a fresh Search each
+    time, and return the measurements of the fastest run.
+    """
+
+    best = None
+    for i in range(repeat):
+        if tracemalloc is not None:
+            tracemalloc.start()
+        recorded = stats.Stats()
+        stop_counting = count_git_calls()
+        start = timeit.default_timer()
+        try:
+            with search.Search(repo_path, stats=recorded) as s:
+                score = getattr(s, method)
+                for block in blocks:
+                    score(block)
+        finally:
+            seconds = timeit.default_timer() - start
+            git_calls = stop_counting()
+            peak_traced = None
+            if tracemalloc is not None:
+                peak_traced = tracemalloc.get_traced_memory()[1] // 1024
+                tracemalloc.stop()
+
+        if best is None or seconds < best['seconds']:
+            best = {'seconds': seconds, 'git_calls': git_calls,
+                    'peak_traced_kb': peak_traced, 'stats': recorded.as_dict()}
+
+    # On Linux, ru_maxrss is in kilobytes.
+    best['peak_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    best['blocks'] = len(blocks)
+    return best
+
+def _run_method(queue, *args):
+    try:
+        queue.put(run_method(*args))
+    except Exception as e:
+        queue.put({'error': '%s: %s' % (type(e).__name__, e)})
+        raise
+
+def run_isolated(*args):
+    """
+    run_method in a process of its own.
+    """
+
+    queue = multiprocessing.Queue()
+    proc = multiprocessing.Process(target=_run_method, args=(queue,) + args)
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+def versions():
+    git_version = subprocess.check_output(['git', '--version'])
+    versions = {'python': platform.python_version(),
+            'git': git_version.decode('ascii').strip(),
+            'gitpython': git.__version__, 'carnival': None}
+    try:
+        carnival = subprocess.check_output(['git', '-C', os.path.dirname(HERE),
+            'describe', '--always', '--dirty'], stderr=subprocess.STDOUT)
+        versions['carnival'] = carnival.decode('ascii').strip()
+    except (subprocess.CalledProcessError, OSError):
+        pass
+    return versions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--repo', help="benchmark this repository instead "
+            "of making one; --blocks files are picked from its HEAD")
+    parser.add_argument('--commits', type=int, default=200)
+    parser.add_argument('--files', type=int, default=20)
+    parser.add_argument('--authors', type=int, default=10)
+    parser.add_argument('--lines', type=int, default=200)
+    parser.add_argument('--churn', choices=fakerepo.CHURN_PATTERNS,
+            default='uniform')
+    parser.add_argument('--edits', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--blocks', type=int, default=None,
+            help="number of files to score (all by default)")
+    parser.add_argument('--methods', nargs='+', choices=METHODS,
+            default=list(METHODS))
+    parser.add_argument('--repeat', type=int, default=1,
+            help="keep the fastest of this many runs")
+    parser.add_argument('--keep', action='store_true',
+            help="don't delete the synthetic repository afterwards")
+    parser.add_argument('--output', help="write the results to this file "
+            "instead of standard output")
+    args = parser.parse_args(argv)
+
+    tmp = None
+    if args.repo:
+        repo_path = args.repo
+        params = {'repo': os.path.abspath(repo_path)}
+    else:
+        tmp = repo_path = tempfile.mkdtemp(prefix='carnival-bench-')
+        start = timeit.default_timer()
+        fake = fakerepo.make_repo(repo_path, commits=args.commits,
+                files=args.files, authors=args.authors, lines=args.lines,
+                churn=args.churn, edits=args.edits, seed=args.seed)
+        params = fake.params()
+        params['seconds_to_create'] = timeit.default_timer() - start
+        if args.keep:
+            params['repo'] = repo_path
+
+    try:
+        paths = git.Repo(repo_path).git.ls_files().splitlines()
+        blocks = paths[:args.blocks] if args.blocks is not None else paths
+
+        results = {}
+        for method in args.methods:
+            results[method] = run_isolated(repo_path, method, blocks,
+                    args.repeat)
+            sys.stderr.write('%s: %s\n' % (method, results[method]))
+    finally:
+        if tmp is not None and not args.keep:
+            shutil.rmtree(tmp)
+
+    output = json.dumps({'time': int(time.time()), 'versions': versions(),
+            'repo': params, 'results': results}, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+if __name__ == '__main__':
+    main()
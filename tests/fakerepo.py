@@ -1,37 +1,178 @@
+"""
+Synthetic git repositories to test and benchmark against.
 
-# TODO maybe it's easier to use a real git repo as the test...
-# 
+make_repo writes a real repository, with a history made up from a few
+parameters:
+
+    commits     number of commits
+    files       number of files
+    authors     number of authors
+    lines       number of lines of every file at the start
+    churn       how commits pick the files they change:
+                    uniform     any file, all alike
+                    hotspot     most commits change the same few files
+                    append      like uniform, but lines are only ever added
+    edits       number of lines every commit changes in each file it touches
+    seed        seed of the random numbers, so the same parameters always
+                make the same history
+
+The history is written with git fast-import, so even large repositories only
+take a moment.
+"""
+
+import os
+import random
+import subprocess
+
+CHURN_PATTERNS = ('uniform', 'hotspot', 'append')
+
+# The commits are a day apart, starting from here.
+START_TIME = 1262304000     # 2010-01-01
+COMMIT_INTERVAL = 60 * 60 * 24
+
+WORDS = ('foo', 'bar', 'baz', 'return', 'self', 'value', 'count', 'if',
+        'for', 'in', 'None', 'def', 'x', 'y', '+', '=', '(', ')')
 
 class FakeRepo(object):
-    def __init__(self):
-        self._git = FakeGitCommand()
-
-    def git(self):
-        return self._git
-
-class FakeGitCommand(object):
-    def __init__(self):
-        self.block_names = ['file1', 'file2']
-        self.blocks = {
-                'file1': 'Hello, how are you doing today?',
-                'file2': 'I am doing fine, thanks!',}
-        self.revs = {
-                'file1': ['0' * 40, '1' * 40, '2' * 40],
-                'file2': ['3' * 40, '4' * 40, '5' * 40],}
-    
-    #def show(*args, **kwargs):
-    def rev_list(self, rev, block):
-        f = open('test_rev_list.txt', 'r')
-        contents = f.read()
-        return contents
-        
-    def show(rev, **kwargs):
-        r  = "1111111111111111111111111111111111111111\n"
-        r += "1280285449\n\n"
-        r += "collectorweb_tests.py\nconfig.py"
-        return r
-
-    def blame(Rev, *args, **kwargs):
-        f = open('test_blame.txt', 'r')
-        contents = f.read()
-        return contents
+    """
+    The parameters of a synthetic repository, and the history they make.
+    """
+
+    def __init__(self, commits=100, files=10, authors=5, lines=100,
+            churn='uniform', edits=5, seed=0):
+        if churn not in CHURN_PATTERNS:
+            raise ValueError("unknown churn pattern: %s" % churn)
+
+        self.commits = commits
+        self.files = files
+        self.authors = authors
+        self.lines = lines
+        self.churn = churn
+        self.edits = edits
+        self.seed = seed
+
+        self._random = None
+        self._line_count = 0
+
+    def params(self):
+        """
+        Return the parameters as a dict, e.g. to record with results.
+        """
+        return {'commits': self.commits, 'files': self.files,
+                'authors': self.authors, 'lines': self.lines,
+                'churn': self.churn, 'edits': self.edits, 'seed': self.seed}
+
+    def paths(self):
+        """
+        Return the paths of the files of the repository.
+        """
+        return ['dir%d/file%d.py' % (i % 4, i) for i in range(self.files)]
+
+    def create(self, path):
+        """
+        Create the repository in the directory path, which mustn't be a
+        repository already, and check out its last commit.
+        """
+
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        git = ['git', '-C', path]
+        subprocess.check_call(git + ['init', '-q'])
+        branch = subprocess.check_output(git + ['symbolic-ref', 'HEAD'])
+        branch = branch.decode('ascii').strip()
+
+        proc = subprocess.Popen(git + ['fast-import', '--quiet'],
+                stdin=subprocess.PIPE)
+        try:
+            for chunk in self.fast_import(branch):
+                proc.stdin.write(chunk)
+        finally:
+            proc.stdin.close()
+        if proc.wait() != 0:
+            raise RuntimeError("git fast-import failed")
+
+        subprocess.check_call(git + ['reset', '-q', '--hard'])
+
+    def fast_import(self, branch='refs/heads/master'):
+        """
+        Yield the history as a git fast-import stream, in chunks of bytes.
+        """
+
+        self._random = random.Random(self.seed)
+        self._line_count = 0
+
+        paths = self.paths()
+        contents = dict((path, [self._line() for i in range(self.lines)])
+                for path in paths)
+        # For the hotspot pattern: the files most commits go to.
+        hot = paths[:max(1, len(paths) // 5)]
+
+        for number in range(self.commits):
+            if number == 0:
+                changed = paths
+            else:
+                changed = self._pick_files(paths, hot)
+                for path in changed:
+                    self._edit(contents[path])
+
+            author = self._random.randrange(self.authors)
+            ident = 'Author %d <author%d@example.com> %d +0000' % (author,
+                    author, START_TIME + number * COMMIT_INTERVAL)
+            message = 'Commit %d\n' % number
+
+            chunk = ['commit %s' % branch, 'mark :%d' % (number + 1),
+                    'author %s' % ident, 'committer %s' % ident,
+                    'data %d' % len(message), message]
+            if number:
+                chunk.append('from :%d' % number)
+            for path in changed:
+                data = ''.join(line + '\n' for line in contents[path])
+                chunk.extend(['M 100644 inline %s' % path,
+                    'data %d' % len(data), data])
+            yield ('\n'.join(chunk) + '\n').encode('utf-8')
+
+    def _pick_files(self, paths, hot):
+        num_files = self._random.randint(1, min(3, len(paths)))
+        if self.churn == 'hotspot' and self._random.random() < 0.8:
+            return self._random.sample(hot, min(num_files, len(hot)))
+        return self._random.sample(paths, num_files)
+
+    def _edit(self, lines):
+        """
+        Change edits lines of a file, given as a list of lines, in place.
+        """
+
+        for i in range(self.edits):
+            if self.churn == 'append':
+                lines.append(self._line())
+                continue
+
+            action = self._random.choice(('replace', 'insert', 'delete'))
+            if not lines:
+                action = 'insert'
+            position = self._random.randrange(len(lines) + 1)
+            if action == 'insert':
+                lines.insert(position, self._line())
+            elif position < len(lines):
+                if action == 'replace':
+                    lines[position] = self._line()
+                else:
+                    del lines[position]
+
+    def _line(self):
+        # Every line is different, so that git never mistakes one for another.
+        self._line_count += 1
+        words = [self._random.choice(WORDS)
+                for i in range(self._random.randint(1, 8))]
+        return '%s  # %d' % (' '.join(words), self._line_count)
+
+
+def make_repo(path, **params):
+    """
+    Create a synthetic repository in path, with the parameters of FakeRepo,
+    and return its FakeRepo.
+    """
+
+    fake = FakeRepo(**params)
+    fake.create(path)
+    return fake
@@ -0,0 +1,48 @@
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+import fakerepo
+from carnival import aio
+from carnival import search
+
+class TestAsyncSearch(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.mkdtemp()
+        cls.path = os.path.join(cls.tmp, 'repo')
+        cls.fake = fakerepo.make_repo(cls.path, commits=40, files=8,
+                authors=4, lines=20, seed=6)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp)
+
+    def test_trees_at_different_commits(self):
+        async def scores():
+            async with aio.AsyncSearch(self.path) as s:
+                old, new = await asyncio.gather(
+                        s.score_last_commit(search.Block('dir0/',
+                            rev='HEAD~30')),
+                        s.score_last_commit(search.Block('dir1/',
+                            rev='HEAD')))
+                return old, new, await s.score_last_commit('dir0/')
+
+        old, new, head = asyncio.run(scores())
+        with search.Search(self.path) as s:
+            self.assertEqual(old, s.score_last_commit(search.Block('dir0/',
+                rev='HEAD~30')))
+            self.assertEqual(new, s.score_last_commit('dir1/'))
+            self.assertEqual(head, s.score_last_commit('dir0/'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+import fakerepo
+from carnival import cache
+from carnival import search
+from carnival import stats
+
+class TestCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def stored_size(self, c):
+        return c._db.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def used(self, c):
+        return c._db.execute("SELECT used FROM entries").fetchone()[0]
+
+    def test_get_and_put(self):
+        c = cache.Cache(self.tmp)
+        self.assertIsNone(c.get('blame', 'a' * 40, 'x.py'))
+        c.put('blame', 'a' * 40, [['b' * 40, 'Bob', 'bob@x', 3]],
+                'x.py')
+        self.assertEqual(c.get('blame', 'a' * 40, 'x.py'),
+                [['b' * 40, 'Bob', 'bob@x', 3]])
+        self.assertIsNone(c.get('history', 'a' * 40, 'x.py'))
+        self.assertIsNone(c.get('blame', 'a' * 40, 'y.py'))
+
+        c.put_many('datetime', {'1': 10, '2': 20})
+        self.assertEqual(c.get_many('datetime', ['1', '2', '3']),
+                {'1': 10, '2': 20})
+        c.close()
+
+    def test_size(self):
+        c = cache.Cache(self.tmp)
+        c.put_many('kind', dict((str(i), 'x' * i) for i in range(20)))
+        self.assertEqual(c.size(), self.stored_size(c))
+        # Replacing values counts the new ones only.
+        c.put_many('kind', dict((str(i), 'y') for i in range(10)))
+        self.assertEqual(c.size(), self.stored_size(c))
+
+        # Another Cache on the same file sees the same total.
+        other = cache.Cache(self.tmp)
+        other.put('kind', 'other', 'z' * 100)
+        self.assertEqual(c.size(), self.stored_size(c))
+        self.assertEqual(other.size(), c.size())
+
+        c.clear()
+        self.assertEqual(c.size(), 0)
+        other.close()
+        c.close()
+
+    def test_eviction(self):
+        c = cache.Cache(self.tmp, max_size=1000)
+        value = 'x' * 98     # 100 bytes as JSON.
+        for i in range(10):
+            c.put('kind', str(i), value)
+        self.assertEqual(c.size(), 1000)
+        self.assertEqual(len(c.get_many('kind', [str(i) for i in range(10)])),
+                10)
+
+        # Make 0 the most recently used, as if read a while ago.
+        c._db.execute("UPDATE entries SET used = used - ?",
+                (2 * cache.TOUCH_INTERVAL,))
+        c._db.commit()
+        c.get('kind', '0')
+
+        c.put('kind', 'new', value)
+        self.assertTrue(c.size() <= 900)
+        self.assertEqual(c.size(), self.stored_size(c))
+        kept = c.get_many('kind', [str(i) for i in range(10)] + ['new'])
+        self.assertIn('0', kept)
+        self.assertIn('new', kept)
+        self.assertNotIn('1', kept)
+        c.close()
+
+    def test_reads_touch_rarely(self):
+        c = cache.Cache(self.tmp)
+        c.put('kind', 'rev', 1)
+        used = self.used(c)
+        c.get('kind', 'rev')
+        self.assertEqual(self.used(c), used)
+
+        c._db.execute("UPDATE entries SET used = ?",
+                (time.time() - 2 * cache.TOUCH_INTERVAL,))
+        c._db.commit()
+        c.get('kind', 'rev')
+        self.assertTrue(self.used(c) > time.time() - cache.TOUCH_INTERVAL)
+        c.close()
+
+    def test_search_reuses_results(self):
+        path = os.path.join(self.tmp, 'repo')
+        fake = fakerepo.make_repo(path, commits=10, files=3, seed=11)
+        cache_dir = os.path.join(self.tmp, 'cache')
+
+        with search.Search(path, cache_dir=cache_dir) as s:
+            expected = [(s.score_last_commit(name), s.score_all_commits(name))
+                    for name in fake.paths()]
+
+        recorded = stats.Stats()
+        with search.Search(path, cache_dir=cache_dir, stats=recorded) as s:
+            found = [(s.score_last_commit(name), s.score_all_commits(name))
+                    for name in fake.paths()]
+        self.assertEqual(found, expected)
+        self.assertNotIn('blame', recorded.git)
+        self.assertNotIn('log', recorded.git)
+
+
+if __name__ == '__main__':
+    unittest.main()
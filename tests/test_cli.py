@@ -0,0 +1,126 @@
+import csv
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+import fakerepo
+from carnival import cli
+from carnival import search
+
+class TestCli(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.mkdtemp()
+        cls.path = os.path.join(cls.tmp, 'repo')
+        cls.fake = fakerepo.make_repo(cls.path, commits=20, files=4,
+                authors=3, lines=20, seed=9)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp)
+
+    def run_cli(self, args, stdin=''):
+        """
+        Return (exit status, output) of the command with args.
+        """
+        stdout = io.StringIO()
+        status = cli.main(['--repo', self.path] + args,
+                stdin=io.StringIO(stdin), stdout=stdout)
+        return status, stdout.getvalue()
+
+    def expected(self, block, method='score_all_commits'):
+        with search.Search(self.path) as s:
+            scores = getattr(s, method)(block)
+        return dict(((person.name, person.email), score)
+                for person, score in scores.items())
+
+    def assertSameScores(self, record, expected):
+        found = dict(((score['name'], score['email']), score['score'])
+                for score in record['scores'])
+        self.assertEqual(set(found), set(expected))
+        for person, score in expected.items():
+            self.assertAlmostEqual(found[person], score)
+
+    def test_parse_block(self):
+        self.assertEqual(cli.parse_block('a/b.py'), search.Block('a/b.py'))
+        self.assertEqual(cli.parse_block('a/b.py:10,40'),
+                search.Block('a/b.py', 10, 40))
+        self.assertEqual(cli.parse_block('a/b.py:10,'),
+                search.Block('a/b.py', 10))
+        self.assertEqual(cli.parse_block('glob:a/*.py'),
+                search.Block('a/*.py', glob=True))
+        self.assertEqual(cli.parse_block('a/'), search.Block('a/'))
+
+    def test_blocks_from_stdin(self):
+        paths = self.fake.paths()
+        status, out = self.run_cli([], '\n'.join(paths + ['', 'dir0/']))
+        self.assertEqual(status, 0)
+        records = [json.loads(line) for line in out.splitlines()]
+        self.assertEqual([record['block'] for record in records],
+                paths + ['dir0/'])
+        for record in records:
+            self.assertSameScores(record, self.expected(record['block']))
+
+    def test_methods_and_top(self):
+        path = self.fake.paths()[1]
+        for method, scalar in (('last_commit', 'score_last_commit'),
+                ('all_commits', 'score_all_commits'),
+                ('churn', 'score_churn')):
+            status, out = self.run_cli(['--method', method, path])
+            self.assertEqual(status, 0)
+            self.assertSameScores(json.loads(out), self.expected(path, scalar))
+
+        status, out = self.run_cli(['--top', '1', path])
+        [best] = json.loads(out)['scores']
+        self.assertEqual(best['score'], max(self.expected(path).values()))
+
+    def test_csv(self):
+        path = self.fake.paths()[2]
+        status, out = self.run_cli(['--format', 'csv', path])
+        rows = list(csv.reader(io.StringIO(out)))
+        self.assertEqual(rows[0], ['block', 'name', 'email', 'score'])
+        expected = self.expected(path)
+        self.assertEqual(len(rows) - 1, len(expected))
+        for block, name, email, score in rows[1:]:
+            self.assertEqual(block, path)
+            self.assertAlmostEqual(float(score), expected[(name, email)])
+
+    def test_errors_dont_stop_the_batch(self):
+        path = self.fake.paths()[0]
+        for method, bad in (('last_commit', 'no/such/file.py'),
+                ('last_commit', 'no/such/directory/'),
+                ('churn', path + ':1,5')):
+            status, out = self.run_cli(['--method', method],
+                    '\n'.join([bad, path]))
+            self.assertEqual(status, 1)
+            error, record = [json.loads(line) for line in out.splitlines()]
+            self.assertEqual(error['block'], bad)
+            self.assertIn('error', error)
+            self.assertEqual(record['block'], path)
+
+    def test_help_doesnt_import_git(self):
+        code = ('import sys\n'
+                'from carnival import cli\n'
+                'try:\n'
+                '    cli.main(["--help"])\n'
+                'except SystemExit:\n'
+                '    pass\n'
+                'sys.exit("git" in sys.modules)\n')
+        with open(os.devnull, 'w') as devnull:
+            status = subprocess.call([sys.executable, '-c', code],
+                    cwd=os.path.dirname(HERE), stdout=devnull)
+        self.assertEqual(status, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
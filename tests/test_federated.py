@@ -0,0 +1,90 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+import fakerepo
+from carnival import federated
+from carnival import search
+
+class TestFederatedSearch(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.mkdtemp()
+        cls.repos = {}
+        for seed, authors in ((7, 3), (8, 4)):
+            path = os.path.join(cls.tmp, 'repo%d' % seed)
+            fakerepo.make_repo(path, commits=20, files=4, authors=authors,
+                    lines=20, seed=seed)
+            cls.repos['repo%d' % seed] = path
+        cls.block = fakerepo.FakeRepo(files=4).paths()[0]
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp)
+
+    def unnormalized(self, path):
+        """
+        Return {(name, email): unnormalized score} of self.block in path.
+        """
+        with search.Search(path) as s:
+            contributions, num_lines_total = s._lines_contributed_history(
+                    self.block)
+            scores = s._score_author_contributions(contributions,
+                    normalize=False)
+        return dict(((person.name, person.email), score)
+                for person, score in scores.items())
+
+    def test_merges_people_across_repositories(self):
+        expected = {}
+        for path in self.repos.values():
+            for person, score in self.unnormalized(path).items():
+                expected[person] = expected.get(person, 0) + score
+        total = sum(expected.values())
+
+        with federated.FederatedSearch(self.repos, workers=2) as fs:
+            ranking = fs.score(self.block)
+        self.assertEqual(ranking.errors, {})
+        self.assertEqual(sorted((person.name, person.email) for person in
+            ranking.scores), sorted(expected))
+        for person, score in ranking.scores.items():
+            self.assertAlmostEqual(score, expected[(person.name,
+                person.email)] / total)
+        for scores in ranking.repos.values():
+            self.assertAlmostEqual(sum(scores.values()), 1.0)
+
+        best = ranking.top(2)
+        self.assertEqual(best, fs.top_experts(self.block, k=2))
+        self.assertEqual([score for person, score in best],
+                sorted(ranking.scores.values(), reverse=True)[:2])
+
+    def test_adds_up_people_merged_in_one_repository(self):
+        name = 'repo7'
+        scores = self.unnormalized(self.repos[name])
+        with federated.FederatedSearch({name: self.repos[name]}) as fs:
+            # Author 0 by name and Author 1 by email are now one person.
+            merged = fs.authors.find(name='Author 0',
+                    email='author1@example.com', add=True)
+            ranking = fs.score(self.block)
+        total = sum(scores.values())
+        self.assertAlmostEqual(ranking.scores[merged],
+                (scores[('Author 0', 'author0@example.com')] +
+                 scores[('Author 1', 'author1@example.com')]) / total)
+        self.assertAlmostEqual(sum(ranking.scores.values()), 1.0)
+
+    def test_missing_repository_block(self):
+        with federated.FederatedSearch(self.repos) as fs:
+            ranking = fs.score({'repo7': self.block,
+                'repo8': search.Block(self.block, 1, 2, rev='no-such-rev')})
+        self.assertEqual(list(ranking.errors), ['repo8'])
+        self.assertEqual(list(ranking.repos), ['repo7'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+import fakerepo
+from carnival import search
+
+class TestIndex(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.mkdtemp()
+        cls.path = os.path.join(cls.tmp, 'repo')
+        cls.fake = fakerepo.make_repo(cls.path, commits=40, files=6,
+                authors=4, lines=20, seed=10)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp)
+
+    def scores(self, s, path):
+        """
+        Return the scores of every method for path, by (name, email).
+        """
+        timenow = fakerepo.START_TIME + 50 * fakerepo.COMMIT_INTERVAL
+        found = {}
+        for method in ('last_commit', 'all_commits', 'all_commits_over_time'):
+            found[method] = sorted(((person.name, person.email), score)
+                    for person, score in s.top_experts(path, k=10,
+                        method=method, timenow=timenow))
+        found['score_all_commits'] = sorted(((person.name, person.email),
+            score) for person, score in s.score_all_commits(path).items())
+        found['score_last_commit'] = sorted(((person.name, person.email),
+            score) for person, score in s.score_last_commit(path).items())
+        return found
+
+    def assertSameScores(self, found, expected):
+        self.assertEqual(sorted(found), sorted(expected))
+        for method in expected:
+            self.assertEqual([person for person, score in found[method]],
+                    [person for person, score in expected[method]])
+            for (person, score), (person, expected_score) in zip(
+                    found[method], expected[method]):
+                self.assertAlmostEqual(score, expected_score)
+
+    def test_index_matches_direct_scores(self):
+        index_path = os.path.join(self.tmp, 'built.index')
+        with search.Search(self.path, index_path=index_path) as s:
+            s.build_index()
+            self.assertEqual(s.index.head, s._rev_parse('HEAD'))
+            self.assertEqual(sorted(s.index.blame), sorted(self.fake.paths()))
+        with search.Search(self.path) as direct:
+            with search.Search(self.path, index_path=index_path) as s:
+                for path in self.fake.paths():
+                    self.assertSameScores(self.scores(s, path),
+                            self.scores(direct, path))
+
+    def test_refresh_after_new_commits(self):
+        index_path = os.path.join(self.tmp, 'refreshed.index')
+        with search.Search(self.path, index_path=index_path) as s:
+            s.build_index('HEAD~10')
+            old = s.index.head
+            s.refresh_index('HEAD~10')
+            self.assertEqual(s.index.head, old)
+
+            changed = set(s._git('diff', 'HEAD~10', 'HEAD',
+                name_only=True).split())
+            s.refresh_index('HEAD', blame=False)
+            self.assertEqual(s.index.head, s._rev_parse('HEAD'))
+            # The files changed since were forgotten, the others kept.
+            self.assertEqual(set(s.index.blame),
+                    set(self.fake.paths()) - changed)
+
+        with search.Search(self.path) as direct:
+            direct.build_index()
+            with search.Search(self.path, index_path=index_path) as s:
+                for path in self.fake.paths():
+                    self.assertEqual(s.index.rows('history', path),
+                            direct.index.rows('history', path))
+            direct.index = None
+            with search.Search(self.path, index_path=index_path) as s:
+                for path in self.fake.paths():
+                    self.assertSameScores(self.scores(s, path),
+                            self.scores(direct, path))
+
+
+if __name__ == '__main__':
+    unittest.main()
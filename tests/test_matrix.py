@@ -0,0 +1,86 @@
+import math
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+import fakerepo
+from carnival import matrix
+from carnival import search
+
+class TestContributionMatrix(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.mkdtemp()
+        cls.path = os.path.join(cls.tmp, 'repo')
+        cls.fake = fakerepo.make_repo(cls.path, commits=40, files=6,
+                authors=4, lines=30, edits=4, seed=3)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp)
+
+    def assertSameScores(self, found, expected):
+        self.assertEqual(set(found), set(expected))
+        for person, score in expected.items():
+            self.assertAlmostEqual(found[person], score)
+
+    def test_scores(self):
+        day = matrix.SECONDS_PER_DAY
+        people = ['a', 'b', 'c']
+        times = [0, 10 * day, 100 * day, 1000 * day]
+        num_lines = [5, 1, 2, 7]
+        authors = [0, 1, 0, 2]
+        m = matrix.ContributionMatrix(people, times, num_lines, authors)
+        lmbs = (None, 0.01, 0.005)
+        timenows = (1000 * day, 2000 * day)
+
+        scores = m.scores(lmbs, timenows, min_val=0.1, normalize=False)
+        self.assertEqual(scores.shape, (3, 2, 3))
+        for l, lmb in enumerate(lmbs):
+            for t, timenow in enumerate(timenows):
+                expected = [0.0] * len(people)
+                for then, n, author in zip(times, num_lines, authors):
+                    weight = 1.0
+                    if lmb is not None:
+                        days = float(timenow - then) / day
+                        weight = max(0.1, math.exp(-lmb * days))
+                    expected[author] += n * weight
+                for found, value in zip(scores[l, t].tolist(), expected):
+                    self.assertAlmostEqual(found, value)
+
+        normalized = m.scores(lmbs, timenows)
+        for l in range(len(lmbs)):
+            for t in range(len(timenows)):
+                self.assertAlmostEqual(sum(normalized[l, t].tolist()), 1.0)
+
+    def test_no_contributions(self):
+        m = matrix.ContributionMatrix.from_contributions({}, {})
+        self.assertEqual(m.score_dicts([0.005, None], [1.0]),
+                {(0.005, 1.0): {}, (None, 1.0): {}})
+
+    def test_score_grid(self):
+        timenow = fakerepo.START_TIME + 60 * fakerepo.COMMIT_INTERVAL
+        with search.Search(self.path) as s:
+            for path in self.fake.paths()[:3]:
+                grid = s.score_grid(path, lmbs=(0.005, None),
+                        timenows=[timenow])
+                self.assertSameScores(grid[(0.005, timenow)],
+                        s.score_all_commits_over_time(path, timenow=timenow))
+                self.assertSameScores(grid[(None, timenow)],
+                        s.score_all_commits(path))
+
+                grid = s.score_grid(path, lmbs=(None,), timenows=[timenow],
+                        method='last_commit')
+                self.assertSameScores(grid[(None, timenow)],
+                        s.score_last_commit(path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import git
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+import fakerepo
+from carnival import odb
+from carnival import search
+
+class TestOdb(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.mkdtemp()
+        cls.path = os.path.join(cls.tmp, 'repo')
+        cls.fake = fakerepo.make_repo(cls.path, commits=40, files=6,
+                authors=4, lines=30, edits=4, seed=3)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp)
+
+    def assertSameContributions(self, found, expected):
+        # Revisions that add no lines to the block don't count.
+        found = dict((sha, (c.person, c.num_lines)) for sha, c in
+                found.items() if c.num_lines)
+        expected = dict((sha, (c.person, c.num_lines)) for sha, c in
+                expected.items() if c.num_lines)
+        self.assertEqual(found, expected)
+
+    def test_blamer(self):
+        repo = git.Repo(self.path, odbt=git.GitDB)
+        blamer = odb.Blamer(repo, max_blobs=2, max_diffs=2)
+        head = repo.head.commit.hexsha
+        for path in self.fake.paths():
+            groups = blamer.blame(head, path)
+            with open(os.path.join(self.path, path), 'rb') as f:
+                num_lines = len(f.read().splitlines())
+            self.assertEqual(sum(group.count for group in groups),
+                    num_lines)
+            self.assertEqual(groups[0].final, 1)
+
+            groups = blamer.blame(head, path, 3, 9)
+            self.assertEqual(groups[0].final, 3)
+            self.assertEqual(sum(group.count for group in groups), 7)
+        self.assertTrue(len(blamer._blobs) <= 2)
+        self.assertTrue(len(blamer._diffs) <= 2)
+        self.assertRaises(KeyError, blamer.blame, head, 'no/such/file.py')
+
+    def test_odb_blame(self):
+        with search.Search(self.path) as s:
+            with search.Search(self.path, blame_backend='odb') as odb:
+                revs = s._rev_list(self.fake.paths()[0])
+                for rev in (revs[len(revs) // 2], 'HEAD'):
+                    for path in self.fake.paths():
+                        for block in (search.Block(path),
+                                search.Block(path, 3, 9)):
+                            self.assertSameContributions(
+                                    odb._lines_contributed(block, rev)[0],
+                                    s._lines_contributed(block, rev)[0])
+
+    def test_odb_blame_cache_apart(self):
+        cache_dir = os.path.join(self.tmp, 'odb-cache')
+        index_path = os.path.join(self.tmp, 'odb-index')
+        path = self.fake.paths()[0]
+        with search.Search(self.path, blame_backend='odb',
+                cache_dir=cache_dir, index_path=index_path) as odb:
+            odb.refresh_index()
+            odb.score_last_commit(path)
+            self.assertEqual(odb.index.blame, {})
+            self.assertIsNotNone(odb.cache.get('blame_odb',
+                odb._rev_parse('HEAD'), path))
+            self.assertIsNone(odb.cache.get('blame', odb._rev_parse('HEAD'),
+                path))
+
+        with search.Search(self.path, cache_dir=cache_dir,
+                index_path=index_path) as s:
+            s.score_last_commit(path)
+            self.assertIsNotNone(s.cache.get('blame', s._rev_parse('HEAD'),
+                path))
+
+
+if __name__ == '__main__':
+    unittest.main()
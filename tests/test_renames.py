@@ -0,0 +1,161 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+import fakerepo
+from carnival import renames
+from carnival import search
+
+def make_renames_repo(path):
+    """
+    Create a repository in path where old.py is renamed to new.py and a new
+    old.py is added later on, and copy.py is copied from other.py.
+    """
+
+    env = dict(os.environ)
+    number = [0]
+    devnull = open(os.devnull, 'w')
+
+    def git(*args):
+        subprocess.check_call(('git', '-C', path) + args, env=env,
+                stdout=devnull, stderr=devnull)
+
+    def write(name, lines):
+        with open(os.path.join(path, name), 'w') as f:
+            f.write(''.join(line + '\n' for line in lines))
+        git('add', name)
+
+    def commit(author):
+        number[0] += 1
+        for who in ('AUTHOR', 'COMMITTER'):
+            env['GIT_%s_NAME' % who] = author
+            env['GIT_%s_EMAIL' % who] = '%s@example.com' % author.lower()
+            env['GIT_%s_DATE' % who] = '%d +0000' % (fakerepo.START_TIME +
+                    number[0] * fakerepo.COMMIT_INTERVAL)
+        git('commit', '-q', '-m', 'Commit %d' % number[0])
+
+    os.makedirs(path)
+    git('init', '-q')
+    old = ['old line %d' % i for i in range(10)]
+    other = ['other line %d' % i for i in range(10)]
+    write('old.py', old)
+    write('other.py', other)
+    commit('Alice')
+
+    old += ['more %d' % i for i in range(3)]
+    write('old.py', old)
+    commit('Bob')
+
+    git('mv', 'old.py', 'new.py')
+    commit('Mover')
+
+    write('new.py', old + ['newer 1', 'newer 2'])
+    commit('Carol')
+
+    # A new file where the renamed one used to be.
+    write('old.py', ['reused %d' % i for i in range(5)])
+    commit('Dave')
+
+    write('copy.py', other)
+    write('other.py', other + ['changed'])
+    commit('Mover')
+    devnull.close()
+
+
+class TestRenames(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.mkdtemp()
+        cls.path = os.path.join(cls.tmp, 'repo')
+        make_renames_repo(cls.path)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp)
+
+    def lines(self, s, path):
+        """
+        Return {name: lines added} of the history of path.
+        """
+        contributions, num_lines_total = s._lines_contributed_history(path)
+        lines = {}
+        for contribution in contributions.values():
+            name = contribution.person.name
+            lines[name] = lines.get(name, 0) + contribution.num_lines
+        return dict((name, n) for name, n in lines.items() if n)
+
+    def test_lineage(self):
+        with search.Search(self.path, follow_renames=True) as s:
+            head = s._rev_parse('HEAD')
+            lineage = s._lineage(search.Block('new.py'), head)
+            self.assertEqual([(old, new) for sha, old, new in lineage],
+                    [('old.py', 'new.py')])
+            self.assertEqual(renames.paths('new.py', lineage),
+                    ['new.py', 'old.py'])
+            self.assertEqual([(old, new) for sha, old, new in s._lineage(
+                search.Block('copy.py'), head)], [('other.py', 'copy.py')])
+            self.assertEqual(s._lineage(search.Block('old.py'), head), [])
+
+    def test_history_across_rename(self):
+        with search.Search(self.path, follow_renames=True) as s:
+            # The old.py added after the rename isn't part of new.py.
+            self.assertEqual(self.lines(s, 'new.py'),
+                    {'Alice': 10, 'Bob': 3, 'Carol': 2})
+            self.assertEqual(self.lines(s, 'copy.py'), {'Alice': 10})
+        with search.Search(self.path) as s:
+            self.assertEqual(self.lines(s, 'new.py'),
+                    {'Mover': 13, 'Carol': 2})
+            self.assertEqual(self.lines(s, 'copy.py'), {'Mover': 10})
+
+    def test_history_matches_revs(self):
+        with search.Search(self.path, follow_renames=True) as s:
+            for path in ('new.py', 'copy.py', 'old.py', 'other.py'):
+                block = search.Block(path)
+                contributions, num_lines_total = \
+                        s._lines_contributed_history(block)
+                expected, expected_total = s._lines_contributed_for_revs(
+                        block, s._rev_list(block))
+                self.assertEqual(
+                        dict((sha, c.num_lines) for sha, c in
+                            contributions.items() if c.num_lines),
+                        dict((sha, c.num_lines) for sha, c in
+                            expected.items() if c.num_lines))
+
+    def test_last_commit_and_index(self):
+        index_path = os.path.join(self.tmp, 'renames.index')
+        with search.Search(self.path, index_path=index_path) as s:
+            s.build_index()
+        with search.Search(self.path, index_path=index_path,
+                follow_renames=True) as s:
+            scores = s.score_all_commits('new.py')
+            top = s.top_experts('new.py', k=5)
+            self.assertEqual(dict(top), scores)
+            self.assertNotIn('Mover', [person.name for person in scores])
+
+            scores = s.score_last_commit('copy.py')
+            self.assertEqual([person.name for person in scores], ['Alice'])
+
+    def test_score_approx(self):
+        with search.Search(self.path, follow_renames=True) as s:
+            s.find_renames()
+            scores, error = s.score_approx('new.py')
+            self.assertEqual(error, 0.0)
+            self.assertEqual(scores, s.score_all_commits('new.py'))
+
+    def test_unsupported(self):
+        with search.Search(self.path, follow_renames=True) as s:
+            self.assertRaises(ValueError, s.score_churn, 'new.py')
+        self.assertRaises(ValueError, search.Search, self.path,
+                follow_renames=True, blame_backend='odb')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,181 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
 import unittest
 
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+import fakerepo
+from carnival import search
+
+def make_merge_repo(path):
+    """
+    Create a repository in path whose history of file.py has merges: one
+    that takes both sides as they are, and one that adds lines of its own
+    while resolving a conflict.
+    """
+
+    env = dict(os.environ, GIT_AUTHOR_NAME='Author 0',
+            GIT_AUTHOR_EMAIL='author0@example.com',
+            GIT_COMMITTER_NAME='Author 0',
+            GIT_COMMITTER_EMAIL='author0@example.com')
+    number = [0]
+    devnull = open(os.devnull, 'w')
+
+    def git(*args):
+        subprocess.check_call(('git', '-C', path) + args, env=env,
+                stdout=devnull, stderr=devnull)
+
+    def commit(author, lines, *args):
+        number[0] += 1
+        env['GIT_AUTHOR_NAME'] = 'Author %d' % author
+        env['GIT_AUTHOR_EMAIL'] = 'author%d@example.com' % author
+        env['GIT_AUTHOR_DATE'] = env['GIT_COMMITTER_DATE'] = '%d +0000' % (
+                fakerepo.START_TIME + number[0] * fakerepo.COMMIT_INTERVAL)
+        if lines is not None:
+            with open(os.path.join(path, 'file.py'), 'w') as f:
+                f.write(''.join(line + '\n' for line in lines))
+            git('add', 'file.py')
+        git('commit', '-q', '-m', 'Commit %d' % number[0], *args)
+
+    def merge(branch):
+        subprocess.call(['git', '-C', path, 'merge', '-q', '--no-commit',
+            '--no-ff', branch], env=env, stdout=devnull, stderr=devnull)
+
+    os.makedirs(path)
+    git('init', '-q')
+    git('checkout', '-q', '-b', 'main')
+    lines = ['line %d' % i for i in range(20)]
+    commit(0, lines)
+
+    git('checkout', '-q', '-b', 'side')
+    commit(1, lines[:2] + ['side 1', 'side 2'] + lines[2:])
+    git('checkout', '-q', 'main')
+    commit(2, lines[:15] + ['main 1'] + lines[15:])
+    merge('side')
+    commit(0, None)
+
+    merged = lines[:2] + ['side 1', 'side 2'] + lines[2:15] + ['main 1'] + \
+            lines[15:]
+    git('checkout', '-q', 'side')
+    commit(1, ['side 3'] + merged[1:])
+    git('checkout', '-q', 'main')
+    commit(3, ['main 2'] + merged[1:])
+    merge('side')
+    # Resolve the conflict with a line of the merge's own.
+    commit(4, ['resolved'] + merged[1:] + ['merged'])
+    devnull.close()
+
+
 class TestSearch(unittest.TestCase):
-    pass
 
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.mkdtemp()
+        cls.path = os.path.join(cls.tmp, 'repo')
+        cls.fake = fakerepo.make_repo(cls.path, commits=40, files=6,
+                authors=4, lines=30, edits=4, seed=3)
+        # Lines are only ever added at the end, so the lines from a given one
+        # on are the same range at every commit.
+        cls.append_path = os.path.join(cls.tmp, 'append')
+        cls.append_fake = fakerepo.make_repo(cls.append_path, commits=40,
+                files=6, authors=4, lines=30, edits=4, churn='append', seed=3)
+        cls.merge_path = os.path.join(cls.tmp, 'merges')
+        make_merge_repo(cls.merge_path)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp)
+
+    def assertSameContributions(self, found, expected):
+        # Revisions that add no lines to the block don't count.
+        found = dict((sha, (c.person, c.num_lines)) for sha, c in
+                found.items() if c.num_lines)
+        expected = dict((sha, (c.person, c.num_lines)) for sha, c in
+                expected.items() if c.num_lines)
+        self.assertEqual(found, expected)
+
+    def assertSameScores(self, found, expected):
+        self.assertEqual(set(found), set(expected))
+        for person, score in expected.items():
+            self.assertAlmostEqual(found[person], score)
+
+    def assertHistoryMatchesRevs(self, s, block):
+        contributions, num_lines_total = s._lines_contributed_history(block)
+        expected, expected_total = s._lines_contributed_for_revs(block,
+                s._rev_list(block))
+        self.assertSameContributions(contributions, expected)
+        self.assertEqual(num_lines_total, expected_total)
+
+    def test_history_matches_revs_files(self):
+        with search.Search(self.path) as s:
+            for path in self.fake.paths():
+                self.assertHistoryMatchesRevs(s, search.Block(path))
+
+    def test_history_matches_revs_ranges(self):
+        # _lines_contributed_for_revs blames the same line numbers at every
+        # commit, so compare on ranges that don't move.
+        with search.Search(self.append_path) as s:
+            for path in self.append_fake.paths():
+                self.assertHistoryMatchesRevs(s, search.Block(path, 21))
+                self.assertHistoryMatchesRevs(s, search.Block(path, 5, 12))
+
+    def test_history_matches_revs_merges(self):
+        with search.Search(self.merge_path) as s:
+            self.assertHistoryMatchesRevs(s, search.Block('file.py'))
+
+    def test_history_matches_revs_deleted_file(self):
+        path = os.path.join(self.tmp, 'deleted')
+        fake = fakerepo.make_repo(path, commits=10, files=2, seed=5)
+        name = fake.paths()[0]
+        env = dict(os.environ, GIT_AUTHOR_NAME='Author 9',
+                GIT_AUTHOR_EMAIL='author9@example.com',
+                GIT_COMMITTER_NAME='Author 9',
+                GIT_COMMITTER_EMAIL='author9@example.com')
+        with open(os.devnull, 'w') as devnull:
+            for args in (['rm', '-q', name], ['commit', '-q', '-m', 'Delete']):
+                subprocess.check_call(['git', '-C', path] + args, env=env,
+                        stdout=devnull)
+            os.makedirs(os.path.dirname(os.path.join(path, name)))
+            with open(os.path.join(path, name), 'w') as f:
+                f.write('again\n')
+            for args in (['add', name], ['commit', '-q', '-m', 'Add again']):
+                subprocess.check_call(['git', '-C', path] + args, env=env,
+                        stdout=devnull)
+        with search.Search(path) as s:
+            self.assertHistoryMatchesRevs(s, search.Block(name))
+
+    def test_history_without_diff_prefixes(self):
+        path = os.path.join(self.tmp, 'noprefix')
+        fake = fakerepo.make_repo(path, commits=10, files=4, seed=4)
+        subprocess.check_call(['git', '-C', path, 'config', 'diff.noprefix',
+            'true'])
+        with search.Search(path) as s:
+            for name in fake.paths():
+                self.assertHistoryMatchesRevs(s, search.Block(name))
+            s.build_index(blame=False)
+            self.assertEqual(sorted(s.index.history), sorted(fake.paths()))
+
+    def test_score_approx(self):
+        with search.Search(self.path) as s:
+            path = self.fake.paths()[0]
+            scores, error = s.score_approx(path)
+            self.assertEqual(error, 0.0)
+            self.assertSameScores(scores, s.score_all_commits(path))
+
+            for max_revs in (1, 3):
+                scores, error = s.score_approx(path, max_revs=max_revs)
+                self.assertTrue(0 < error < 1)
+                self.assertAlmostEqual(sum(scores.values()), 1.0)
+
+            scores, error = s.score_approx(path, max_seconds=0)
+            self.assertTrue(scores)
+            self.assertTrue(0 < error < 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
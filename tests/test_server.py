@@ -0,0 +1,135 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+try:
+    from urllib.request import Request, urlopen
+    from urllib.error import HTTPError
+except ImportError:
+    from urllib2 import HTTPError, Request, urlopen
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+import fakerepo
+from carnival import search
+from carnival import server
+
+class TestServer(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.mkdtemp()
+        cls.path = os.path.join(cls.tmp, 'repo')
+        cls.fake = fakerepo.make_repo(cls.path, commits=20, files=4,
+                authors=3, lines=20, seed=5)
+        cls.service = server.Service({'fake': cls.path}, max_contributions=2)
+        cls.server = server.Server(cls.service, ('127.0.0.1', 0))
+        cls.thread = threading.Thread(target=cls.server.serve_forever)
+        cls.thread.daemon = True
+        cls.thread.start()
+        cls.url = 'http://%s:%d' % cls.server.server_address[:2]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        cls.service.close()
+        shutil.rmtree(cls.tmp)
+
+    def request(self, path, query=None, data=None):
+        """
+        Return (status, body) of the answer to a GET of path, or a POST of
+        query as JSON (or of data as it is) if given.
+        """
+        if query is not None:
+            data = json.dumps(query).encode('utf-8')
+        try:
+            response = urlopen(Request(self.url + path, data))
+        except HTTPError as e:
+            response = e
+        try:
+            return response.code, json.loads(response.read().decode('utf-8'))
+        finally:
+            response.close()
+
+    def expected(self, block, method='score_all_commits'):
+        with search.Search(self.path) as s:
+            scores = getattr(s, method)(block)
+        return sorted(((person.name, person.email), score)
+                for person, score in scores.items())
+
+    def found(self, body):
+        return sorted(((score['name'], score['email']), score['score'])
+                for score in body['scores'])
+
+    def assertSameScores(self, found, expected):
+        self.assertEqual([person for person, score in found],
+                [person for person, score in expected])
+        for (person, score), (person, expected_score) in zip(found, expected):
+            self.assertAlmostEqual(score, expected_score)
+
+    def test_repos(self):
+        with search.Search(self.path) as s:
+            head = s._rev_parse('HEAD')
+        self.assertEqual(self.request('/repos'), (200, {'fake': head}))
+
+    def test_score(self):
+        path = self.fake.paths()[0]
+        status, body = self.request('/score', {'repo': 'fake', 'block': path})
+        self.assertEqual(status, 200)
+        self.assertEqual(body['block'], path)
+        self.assertSameScores(self.found(body), self.expected(path))
+
+        status, body = self.request('/score', {'repo': 'fake', 'block':
+            {'path': path, 'start': 2, 'end': 8}, 'method': 'last_commit'})
+        self.assertEqual(status, 200)
+        self.assertSameScores(self.found(body),
+                self.expected(search.Block(path, 2, 8), 'score_last_commit'))
+
+    def test_top(self):
+        status, body = self.request('/top', {'repo': 'fake', 'block': 'dir0/',
+            'k': 2})
+        self.assertEqual(status, 200)
+        scores = [score['score'] for score in body['scores']]
+        self.assertEqual(len(scores), 2)
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+    def test_refresh(self):
+        status, body = self.request('/refresh', {'repo': 'fake'})
+        self.assertEqual(status, 200)
+        self.assertEqual(body['head'], self.request('/repos')[1]['fake'])
+
+    def test_bad_requests(self):
+        path = self.fake.paths()[0]
+        for query in ({'repo': 'nope', 'block': path},
+                {'repo': 'fake'},
+                {'repo': 'fake', 'block': path, 'method': 'nope'},
+                {'repo': 'fake', 'block': 'no/such/file.py',
+                    'method': 'last_commit'},
+                {'repo': 'fake', 'block': {'start': 1}},
+                ['not', 'an', 'object']):
+            status, body = self.request('/score', query)
+            self.assertEqual(status, 400, query)
+            self.assertIn('error', body)
+        self.assertEqual(self.request('/score', data=b'{not json')[0], 400)
+        self.assertEqual(self.request('/refresh', {})[0], 400)
+        self.assertEqual(self.request('/nope', {})[0], 404)
+
+    def test_contributions_are_bounded(self):
+        for path in self.fake.paths():
+            self.assertEqual(self.request('/score', {'repo': 'fake',
+                'block': path})[0], 200)
+        contributions = self.service.contributions['fake']
+        self.assertEqual(len(contributions), 2)
+        self.assertEqual([key[2] for key in contributions],
+                self.fake.paths()[-2:])
+
+
+if __name__ == '__main__':
+    unittest.main()
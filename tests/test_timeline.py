@@ -0,0 +1,92 @@
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+import fakerepo
+from carnival import search
+from carnival import timeline
+
+def naive_scores(contributions, timenow, lmb, min_val, aging):
+    """
+    Return the normalised scores at timenow, summing the weight of every
+    contribution made up to it from scratch.
+    """
+    scores = {}
+    for then, person, num_lines in contributions:
+        if then > timenow:
+            continue
+        weight = 1.0
+        if aging == 'exp':
+            days = float(timenow - then) / timeline.SECONDS_PER_DAY
+            weight = max(min_val, math.exp(-lmb * days))
+        scores[person] = scores.get(person, 0.0) + num_lines * weight
+    total = sum(scores.values())
+    return dict((person, score / total) for person, score in scores.items())
+
+
+class TestTimeline(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.mkdtemp()
+        cls.path = os.path.join(cls.tmp, 'repo')
+        cls.fake = fakerepo.make_repo(cls.path, commits=40, files=6,
+                authors=4, lines=30, edits=4, seed=3)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp)
+
+    def assertSameScores(self, found, expected):
+        self.assertEqual(set(found), set(expected))
+        for person, score in expected.items():
+            self.assertAlmostEqual(found[person], score)
+
+    def test_snapshots(self):
+        day = timeline.SECONDS_PER_DAY
+        rng = random.Random(7)
+        contributions = [(rng.randint(0, 2000) * day, rng.choice('abcd'),
+            rng.randint(1, 20)) for i in range(200)]
+        timepoints = [rng.randint(1, 3000) * day for i in range(30)]
+        for aging, lmb, min_val in (('exp', 0.005, 0.1), ('exp', 0.05, 0.2),
+                ('exp', 0.005, 0), (None, 0.005, 0.1)):
+            found = timeline.snapshots(contributions, timepoints, lmb=lmb,
+                    min_val=min_val, aging=aging)
+            self.assertEqual([timepoint for timepoint, scores in found],
+                    sorted(timepoints))
+            for timepoint, scores in found:
+                self.assertSameScores(scores, naive_scores(contributions,
+                    timepoint, lmb, min_val, aging))
+
+    def test_snapshots_before_any_contribution(self):
+        self.assertEqual(timeline.snapshots([(100, 'a', 3)], [50, 100]),
+                [(50, {}), (100, {'a': 1.0})])
+
+    def test_score_timeline(self):
+        with search.Search(self.path) as s:
+            path = self.fake.paths()[0]
+            revs = s._rev_list(path)
+            for sha in (revs[len(revs) // 2], revs[-1]):
+                then = s._datetime(sha)
+                [(timepoint, scores)] = s.score_timeline(path,
+                        timepoints=[then])
+                self.assertEqual(timepoint, then)
+                self.assertSameScores(scores, s.score_all_commits_over_time(
+                    search.Block(path, rev=sha), timenow=then))
+
+                [(timepoint, scores)] = s.score_timeline(path,
+                        timepoints=[then], aging=None)
+                self.assertSameScores(scores, s.score_all_commits(
+                    search.Block(path, rev=sha)))
+
+
+if __name__ == '__main__':
+    unittest.main()